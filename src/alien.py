@@ -1,14 +1,17 @@
 
 from board import Position
-from entity import Shape
+from path_table import spiral_table
+from shot_pool import FACTION_STARSHIP
+from sprite import BEE_SPRITE, BOSS_SPRITE, ABDUCTOR_SPRITE
 import copy, math, random
 
 class AlienSoul(object):
-    def __init__(self, shape):
-        self.shape = shape
+    # The name levels and snapshots know the soul by, if any
+    name = None
 
-    def shape(self):
-        return self.shape
+    # The sprite is shared by every alien with this soul; each alien has its own Shape
+    def __init__(self, sprite):
+        self.sprite = sprite
 
     def dance_entity(self, alienEntity) -> None:
         (positionDelta, newDance) = alienEntity.dance_stage.advance(alienEntity.position)
@@ -20,12 +23,18 @@ class AlienSoul(object):
         return 10 * (currentLevel**2)
 
 class BeeSoul(AlienSoul):
+    name = "bee"
+
     def __init__(self):
-        super().__init__(Shape("bee", (16, 16)))
+        super().__init__(BEE_SPRITE)
 
     def initialize_entity(self, alienEntity) -> None:
         alienEntity.dance_stage = BeeSpiral(
-            BeeBackAndForth(5), alienEntity.position, alienEntity.positionAtRest)
+            self.resting_dance(alienEntity), alienEntity.position, alienEntity.positionAtRest)
+
+    # The dance once the bee has flown in
+    def resting_dance(self, alienEntity):
+        return BeeBackAndForth(5)
 
     def is_entity_incoming(self, alienEntity) -> bool:
         return alienEntity.dance_stage.is_incoming()
@@ -34,12 +43,17 @@ class BeeSoul(AlienSoul):
         return 20
 
 class BossSoul(AlienSoul):
+    name = "boss"
+
     def __init__(self, game):
-        super().__init__(Shape("boss", (16, 16)))
+        super().__init__(BOSS_SPRITE)
         self.game = game
 
     def initialize_entity(self, alienEntity) -> None:
-        alienEntity.dance_stage = BossAvoidShots(self.game)
+        alienEntity.dance_stage = self.resting_dance(alienEntity)
+
+    def resting_dance(self, alienEntity):
+        return BossAvoidShots(self.game)
 
     def score_when_killed(self, currentLevel: int) -> int:
         return 100 * currentLevel
@@ -49,9 +63,15 @@ class BossSoul(AlienSoul):
 
 class AbductorSoul(AlienSoul):
     def __init__(self):
-        super().__init__(Shape("abductor", (16, 16)))
+        super().__init__(ABDUCTOR_SPRITE)
         self.has_starship = False
 
+# Creates the soul of each kind of alien, by name, for the given game
+SOULS = {
+    BeeSoul.name: lambda game: BeeSoul(),
+    BossSoul.name: lambda game: BossSoul(game)
+}
+
 class DanceStage(object):
     def __init__(self, isIncoming, nextDance):
         self.isIncoming = isIncoming
@@ -70,35 +90,44 @@ class DanceStage(object):
     def advance_or_cede(self):
         raise Error("Must be implemented by sub-types")
 
+    # Stages with equal keys, which are not None, move in lockstep from now on,
+    # so aliens dancing them may be stepped together as a Formation
+    def formation_key(self):
+        return None
+
+# Flies along a shared path table, scaled by (xscale, yscale), then cedes
+# Each step is a table lookup, rather than evaluating the path
+class FollowPath(DanceStage):
+    def __init__(self, nextDance, table, xscale: float = 1, yscale: float = 1, isIncoming: bool = True):
+        super().__init__(isIncoming, nextDance)
+        self.table = table
+        self.xscale = xscale
+        self.yscale = yscale
+        self.step = 0
+
+    # Follows a path whose table runs from (0, 0) to (1, 1), from start to end
+    @staticmethod
+    def between(nextDance, table, startPosition, endPosition):
+        return FollowPath(nextDance, table, endPosition.x - startPosition.x,
+                          endPosition.y - startPosition.y)
+
+    def advance_or_cede(self, position):
+        (dx, dy) = self.table.deltas[self.step]
+        self.step += 1
+        positionDelta = Position(dx * self.xscale, dy * self.yscale)
+        return (positionDelta, self.step >= len(self.table))
+
 # Uses the formula r = theta to create a spiral
 # Then dr/dtheta = 1
-class BeeSpiral(DanceStage):
+class BeeSpiral(FollowPath):
     def __init__(self, nextDance, startPosition, endPosition, timeToReach = 32):
-        super().__init__(True, nextDance)
-        # We start at 2π/3 then move to 0
-        self.theta = 2 * math.pi / 3
-        # The amount of moves to reach the destination
-        self.timeToReach = timeToReach
-        # These will be later used to convert unit circle -> galaga position
+        # These convert the formula's units to galaga positions
         targetXdiff = endPosition.x - startPosition.x
         targetYdiff = endPosition.y - startPosition.y
         formulaXdiff = (-1) * (2 * math.pi / 3) * math.cos(2 * math.pi / 3)
         formulaYdiff = (-1) * (2 * math.pi / 3) * math.sin(2 * math.pi / 3)
-        self.xscale = targetXdiff / formulaXdiff
-        self.yscale = targetYdiff / formulaYdiff
-
-    def advance_or_cede(self, position):
-        thetaInitial = self.theta
-        thetaFinal = thetaInitial - 2 * math.pi / (3 * self.timeToReach)
-        self.theta = thetaFinal
-
-        # Calculate dx, dy given dr and thetas
-        # Note that r = theta => dr = dtheta simplifies the mathematics here
-        (x0, y0) = (thetaInitial * math.cos(thetaInitial), thetaInitial * math.sin(thetaInitial))
-        (x1, y1) = (thetaFinal * math.cos(thetaFinal), thetaFinal * math.sin(thetaFinal))
-        positionDelta = Position((x1 - x0) * self.xscale, (y1 - y0) * self.yscale)
-        # We've reached the end of the spiral if theta <= 0
-        return (positionDelta, thetaFinal <= 0)
+        super().__init__(nextDance, spiral_table(timeToReach),
+                         targetXdiff / formulaXdiff, targetYdiff / formulaYdiff)
 
 # Very simple X steps right, X steps left dance
 class BeeBackAndForth(DanceStage):
@@ -115,37 +144,37 @@ class BeeBackAndForth(DanceStage):
         # The back-and-forth never stops
         return (positionDelta, False)
 
+    def formation_key(self):
+        return (BeeBackAndForth, self.stepAmount, self.stage)
+
 class BossAvoidShots(DanceStage):
     def __init__(self, game):
         super().__init__(False, None)
         self.game = game
 
+    # Only the starship's shots at or below the boss can still hit it
     def advance_or_cede(self, bossPosition):
-        shotsToTheLeft = 0
-        shotsToTheRight = 0
-        for shot in self.game.shots:
-            if shot.position.x > bossPosition.x:
-                shotsToTheRight += 1
-            else:
-                shotsToTheLeft += 1
+        density = self.game.shotPool.density
+        (shotsToTheLeft, shotsToTheRight) = density.count_beside(FACTION_STARSHIP, bossPosition.x,
+                                                                 bossPosition.y)
         if bossPosition.x < 20 or bossPosition.x > 200:
             xdiff = 0
         else:
             xdiff = -2 if shotsToTheRight > shotsToTheLeft else 2
-        positionDelta = Position(xdiff, 0)
-        if (positionDelta + bossPosition).is_out_of_bounds():
-            positionDelta = Position(0, 0)
-        return (positionDelta, False)
+        if bossPosition.translated(xdiff, 0).is_out_of_bounds():
+            xdiff = 0
+        return (Position(xdiff, 0), False)
 
 # Tests the spiral
 def testBeeSpiral() -> None:
     print("Testing testBeeSpiral()...")
     nextDance = BeeBackAndForth(5)
-    spiral = BeeSpiral(nextDance, Position(0, 0), Position(1, 1), 4)
-    (delta1, _) = spiral.advance()
-    (delta2, _) = spiral.advance()
-    (delta3, _) = spiral.advance()
-    (delta4, _) = spiral.advance()
+    startPosition = Position(0, 0)
+    spiral = BeeSpiral(nextDance, startPosition, Position(1, 1), 4)
+    (delta1, _) = spiral.advance(startPosition)
+    (delta2, _) = spiral.advance(startPosition + delta1)
+    (delta3, _) = spiral.advance(startPosition + delta1 + delta2)
+    (delta4, _) = spiral.advance(startPosition + delta1 + delta2 + delta3)
     resultPosition = delta1 + delta2 + delta3 + delta4
     assert resultPosition == Position(1, 1), f"Really {resultPosition}"
     print("Passed")
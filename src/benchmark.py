@@ -0,0 +1,142 @@
+from alien import *
+from board import *
+from engine import Galaga
+from entity import *
+from game import *
+from gallery import Gallery
+from levels import Campaign
+from image_cache import ROTATION_BUCKETS, sprite_handler
+from shot_pool import FACTION_STARSHIP
+import argparse, json, math, os, platform, random, statistics, time
+
+# Deterministic benchmarks of the simulation hot paths
+# Every run uses seeded randomness and synthetic waves, and results are emitted as JSON
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "images")
+
+# Times run(state) repeatedly, calling setup() before each run without timing it
+def measure(run, repeats: int, setup = lambda: None) -> dict:
+    durations = []
+    for _ in range(repeats):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        durations.append(time.perf_counter() - start)
+    return { "repeats": repeats,
+             "minMs": min(durations) * 1000,
+             "medianMs": statistics.median(durations) * 1000,
+             "meanMs": statistics.mean(durations) * 1000 }
+
+def new_benchmark_galaga(gallery, seed: int = 0):
+    game = Game(GameplayRegulator(), Starship(Position(112, 15)), random.Random(seed))
+    return Galaga(game, gallery, Campaign({ "version": Campaign.VERSION, "levels": [] }), seed)
+
+# Adds bees at rest in a formation of rows, wrapping around once the board is full
+def add_synthetic_swarm(game, count: int) -> None:
+    for index in range(count):
+        (row, column) = divmod(index, 12)
+        position = Position(24 + column * 16, 270 - (row % 10) * 16)
+        alien = Alien(position, position, BeeSoul())
+        alien.dance_stage = BeeBackAndForth(5)
+        game.add_alien(alien)
+
+# Adds starship shots scattered over the board
+def add_synthetic_shots(game, rng, count: int) -> None:
+    for _ in range(count):
+        position = Position(rng.uniform(8, 216), rng.uniform(0, 280))
+        game.add_shot(position, (0, 1), FACTION_STARSHIP)
+
+def bench_collision_paths(gallery, repeats: int) -> dict:
+    alien = Alien(Position(108, 108), Position(108, 108), BeeSoul())
+    paths = []
+    for step in range(64):
+        angle = math.pi * step / 64
+        (dx, dy) = (12 * math.cos(angle), 12 * math.sin(angle))
+        path = CollisionPath(Position(108 - dx, 108 - dy), Position(108 + dx, 108 + dy))
+        paths.append(path)
+    # Build the mask before timing
+    alien.collides_with(paths[0], gallery)
+    def run(_):
+        for path in paths:
+            alien.collides_with(path, gallery)
+    return measure(run, repeats)
+
+def bench_move_shots(gallery, seed: int, shotCount: int, repeats: int) -> dict:
+    rng = random.Random(seed)
+    def setup():
+        galaga = new_benchmark_galaga(gallery)
+        add_synthetic_swarm(galaga.game, 48)
+        add_synthetic_shots(galaga.game, rng, shotCount)
+        return galaga
+    return measure(lambda galaga: galaga.game.move_all_shots(galaga), repeats, setup)
+
+def bench_dance_aliens(gallery, seed: int, swarmSize: int, repeats: int) -> dict:
+    # Every alien dances once per dance period, so time a whole period of ticks
+    def dance_period(galaga):
+        regulator = galaga.game.regulator
+        for _ in range(regulator.danceEveryThisTicks):
+            regulator.tick()
+            galaga.game.dance_aliens()
+    def setup():
+        galaga = new_benchmark_galaga(gallery, seed)
+        add_synthetic_swarm(galaga.game, swarmSize)
+        # The swarm falls into its formation on its first step
+        dance_period(galaga)
+        return galaga
+    return measure(dance_period, repeats, setup)
+
+def bench_boss_avoid_shots(gallery, seed: int, shotCount: int, repeats: int) -> dict:
+    rng = random.Random(seed)
+    def setup():
+        galaga = new_benchmark_galaga(gallery)
+        add_synthetic_shots(galaga.game, rng, shotCount)
+        return BossAvoidShots(galaga.game)
+    bossPosition = Position(112, 250)
+    def run(stage):
+        for _ in range(100):
+            stage.advance_or_cede(bossPosition)
+    return measure(run, repeats, setup)
+
+def bench_gallery(cold: bool, repeats: int) -> dict:
+    viewport = Viewport(448, 576, (0, 0, 0))
+    handlers = [ sprite_handler((16, 16), bucket) for bucket in range(0, ROTATION_BUCKETS, ROTATION_BUCKETS // 16) ]
+    warmGallery = Gallery(IMAGE_DIR)
+    def run(gallery):
+        for id in ("bee", "boss"):
+            for handler in handlers:
+                gallery.get_pil_image(viewport, id, handler)
+                gallery.get_collision_mask(id, handler)
+    run(warmGallery)
+    setup = (lambda: Gallery(IMAGE_DIR)) if cold else (lambda: warmGallery)
+    return measure(run, repeats, setup)
+
+def run_benchmarks(seed: int, repeats: int) -> dict:
+    gallery = Gallery(IMAGE_DIR)
+    results = dict()
+    results["collisionPaths"] = bench_collision_paths(gallery, repeats)
+    for shotCount in (10, 100, 1000):
+        results[f"moveShots.{shotCount}"] = bench_move_shots(gallery, seed, shotCount, repeats)
+    for swarmSize in (48, 480):
+        results[f"danceAliens.{swarmSize}"] = bench_dance_aliens(gallery, seed, swarmSize, repeats)
+    results["bossAvoidShots.1000"] = bench_boss_avoid_shots(gallery, seed, 1000, repeats)
+    # Cold lookups decode and render from scratch, so use fewer repeats
+    results["gallery.cold"] = bench_gallery(True, max(repeats // 10, 1))
+    results["gallery.warm"] = bench_gallery(False, repeats)
+    return { "seed": seed, "repeats": repeats, "python": platform.python_version(),
+             "benchmarks": results }
+
+def main():
+    parser = argparse.ArgumentParser(description = "Runs the Galaga benchmarks, printing JSON")
+    parser.add_argument("--seed", type = int, default = 112)
+    parser.add_argument("--repeats", type = int, default = 20)
+    parser.add_argument("--output", help = "write the results to this file instead of stdout")
+    args = parser.parse_args()
+    results = json.dumps(run_benchmarks(args.seed, args.repeats), indent = 2)
+    if args.output == None:
+        print(results)
+    else:
+        with open(args.output, "w") as file:
+            file.write(results)
+
+if __name__ == "__main__":
+    main()
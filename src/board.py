@@ -1,5 +1,5 @@
 
-import math, copy
+import math
 
 # View: Galaga uses a 288 x 224 pixel board
 MAX_PIXEL_X = 224
@@ -7,7 +7,11 @@ MAX_PIXEL_Y = 288
 
 # A position is defined in terms of Galaga coordinates - which are Cartesian
 # May represent either an absolute position or a difference between positions
+# Positions are slotted so they are compact and cheap to create. They are hashed and
+# shared, so they are immutable by convention: positions are replaced, never modified
 class Position(object):
+    __slots__ = ("x", "y")
+
     def __init__(self, x: int, y: int):
         self.x = x
         self.y = y
@@ -40,6 +44,10 @@ class Position(object):
     def __mul__(self, rhs):
         return Position(self.x * rhs, self.y * rhs)
 
+    # Adds a difference given as coordinates, without creating a Position for it
+    def translated(self, dx, dy):
+        return Position(self.x + dx, self.y + dy)
+
     def __eq__(self, other) -> bool:
         if not isinstance(other, Position):
             return False
@@ -47,7 +55,7 @@ class Position(object):
         return abs(self.x - other.x) < EPSILON and abs(self.y - other.y) < EPSILON
 
     def __hash__(self):
-        return hash((round(self.y), round(self.y)))
+        return hash((round(self.x), round(self.y)))
 
     def is_out_of_bounds(self) -> bool:
         return (self.x < 0 or self.y < 0 or
@@ -74,8 +82,18 @@ class Position(object):
 def board_pixel_size(app) -> (int, int):
     return (app.width / MAX_PIXEL_X, app.height / MAX_PIXEL_Y)
 
+# The parts of the app which image handlers read
+# Allows images to be rendered without a window, e.g. for collision masks
+class Viewport(object):
+    def __init__(self, width: int, height: int, backgroundColor):
+        self.width = width
+        self.height = height
+        self.backgroundColor = backgroundColor
+
 # A radian direction which handles float precision checks
 class Direction(object):
+    __slots__ = ("radians",)
+
     def __init__(self, radians: float):
         self.radians = radians
 
@@ -88,6 +106,11 @@ class Direction(object):
     def __hash__(self):
         return hash(self.radians)
 
+    # The index of the nearest of the given amount of evenly spaced headings
+    def bucket(self, buckets: int) -> int:
+        bucketWidth = 2 * math.pi / buckets
+        return round(self.radians / bucketWidth) % buckets
+
     def __repr__(self) -> str:
         fractionOfPi = self.radians / math.pi
         return f"{fractionOfPi}π"
@@ -104,71 +127,6 @@ class LineSegment(object):
         return (maxmin(self.position1.x, self.position2.x),
                 maxmin(self.position1.y, self.position2.y))
 
-    def slope_and_intercept(self):
-        (position1, position2) = (self.position1, self.position2)
-        if position1.x == position2.x:
-            return (None, position1.x)
-        slope = (position1.y - position2.y) / (position1.x - position2.x)
-        intercept = position1.y - slope * position1.x # y - mx
-        return (slope, intercept)
-
-    # Similar to fit_within except used for testing purposes
-    # Is non-destructive and takes different parameters
-    def test_fit_within(self, scanBounds):
-        (((scanMinX, scanMinY), (scanMaxX, scanMaxY))) = scanBounds
-        selfCopy = copy.deepcopy(self)
-        selfCopy.fit_within(((scanMaxX, scanMinX), (scanMaxY, scanMinY)), True)
-        return selfCopy
-
-    # Destructive method which fits this segment within the given image
-    # Returns False if this segment cannot fit
-    def fit_within(self, image) -> bool:
-        ((maxX, minX), (maxY, minY)) = self.max_min_bounds()
-        (imageBoxBottomLeft, imageBoxTopRight) = image.boundingBox
-        if maxX < imageBoxBottomLeft.x or minX > imageBoxTopRight.x:
-            return False
-        if maxY < imageBoxBottomLeft.y or minY > imageBoxTopRight.y:
-            return False
-        upperBoundX = min(maxX, imageBoxTopRight.x)
-        lowerBoundX = max(minX, imageBoxBottomLeft.x)
-        upperBoundY = min(maxY, imageBoxTopRight.y)
-        lowerBoundY = max(minY, imageBoxBottomLeft.y)
-        (slope, intercept) = self.slope_and_intercept()
-        if slope == None:
-            xline = intercept
-            self.position1 = Position(xline, upperBoundY)
-            self.position2 = Position(xline, lowerBoundY)
-            return True
-        (position1, position2) = (self.position1, self.position2)
-        rightMostPosition = position1 if position1.x >= position2.x else position2
-        leftMostPosition = position2 if rightMostPosition == position1 else position1
-        if image.assertions:
-            assert len({rightMostPosition, leftMostPosition}) == 2
-        yAtRightMostX = slope * upperBoundX + intercept
-        yAtLeftMostX = slope * lowerBoundX + intercept
-        if yAtRightMostX <= upperBoundY and yAtRightMostX >= lowerBoundY:
-            # Bounded by x on the right
-            rightMostPosition.x = upperBoundX
-            rightMostPosition.y = yAtRightMostX
-        else:
-            # Bounded by y on the right
-            # Determine whether this is an upper or lower bound
-            whichBoundY = upperBoundY if slope > 0 else lowerBoundY
-            rightMostPosition.y = whichBoundY
-            rightMostPosition.x = (whichBoundY - intercept) / slope
-        if yAtLeftMostX <= upperBoundY and yAtLeftMostX >= lowerBoundY:
-            # Bounded by x on the left
-            leftMostPosition.x = lowerBoundX
-            leftMostPosition.y = yAtLeftMostX
-        else:
-            # Bounded by y on the left
-            # Determine whether this is an upper or lower bound
-            whichBoundY = upperBoundY if slope < 0 else lowerBoundY
-            leftMostPosition.y = whichBoundY
-            leftMostPosition.x = (whichBoundY - intercept) / slope
-        # All done: self.position1 and self.position2 were mutated
-        return True
-
     def __eq__(self, other) -> bool:
         if not isinstance(other, LineSegment):
             return False
@@ -177,62 +135,110 @@ class LineSegment(object):
     def __repr__(self) -> str:
         return f"From {self.position1} to {self.position2}"
 
+# The path swept by a moving shot, tested against sprite masks
+# The segment is clipped to the sprite's box (Liang-Barsky), then each mask row
+# the clipped segment crosses is tested with a single bitwise AND of the run of
+# columns it covers. Every cell the segment touches is tested, however steep the
+# segment or long the step, so fast shots cannot tunnel through a sprite
 class CollisionPath(object):
     def __init__(self, position1, position2):
         self.segment = LineSegment(position1, position2)
 
-    def intersects_with_image(self, image) -> bool:
-        image.assertions = self.isDebugging
-        # Squeeze the segment to be bounded by the image box
-        segment = copy.deepcopy(self.segment)
-        if not segment.fit_within(image):
+    # Returns the (t0, t1) parameters of the part of the segment inside the box,
+    # or None if the segment misses it
+    def clip_to_box(self, minX, minY, maxX, maxY):
+        (position1, position2) = (self.segment.position1, self.segment.position2)
+        (x0, y0) = (position1.x, position1.y)
+        (dx, dy) = (position2.x - x0, position2.y - y0)
+        (t0, t1) = (0.0, 1.0)
+        for (p, q) in ((-dx, x0 - minX), (dx, maxX - x0), (-dy, y0 - minY), (dy, maxY - y0)):
+            if p == 0:
+                # Parallel to this edge: either entirely inside or entirely outside
+                if q < 0:
+                    return None
+                continue
+            t = q / p
+            if p < 0:
+                if t > t1:
+                    return None
+                t0 = max(t0, t)
+            else:
+                if t < t0:
+                    return None
+                t1 = min(t1, t)
+        return (t0, t1)
+
+    def intersects_mask(self, collisionMask, boundingBox) -> bool:
+        (boxBottomLeft, boxTopRight) = boundingBox
+        clipped = self.clip_to_box(boxBottomLeft.x, boxBottomLeft.y, boxTopRight.x, boxTopRight.y)
+        if clipped == None:
             return False
-        # segment is now be bounded by the image box
-        ((scanMaxX, scanMinX), (scanMaxY, scanMinY)) = segment.max_min_bounds()
-        (slope, intercept) = segment.slope_and_intercept()
-        if slope == None:
-            scanX = intercept
-            for scanY in range(math.floor(scanMinY), math.ceil(scanMaxY)):
-                if image.position_is_part_of_image(scanX, scanY):
-                    return True
-        else:
-            for scanX in range(math.floor(scanMinX), math.ceil(scanMaxX)):
-                scanY = slope * scanX + intercept
-                if image.position_is_part_of_image(scanX, scanY):
-                    return True
+        (t0, t1) = clipped
+        (position1, position2) = (self.segment.position1, self.segment.position2)
+        (dx, dy) = (position2.x - position1.x, position2.y - position1.y)
+        (maskWidth, maskHeight) = (collisionMask.width, collisionMask.height)
+        cellsPerX = maskWidth / (boxTopRight.x - boxBottomLeft.x)
+        cellsPerY = maskHeight / (boxTopRight.y - boxBottomLeft.y)
+        # Convert the clipped end points into mask cells. Rows go top to bottom: up is down
+        def to_cells(t):
+            x = (position1.x + t * dx - boxBottomLeft.x) * cellsPerX
+            y = (boxTopRight.y - (position1.y + t * dy)) * cellsPerY
+            return (x, y)
+        ((cellX0, cellY0), (cellX1, cellY1)) = (to_cells(t0), to_cells(t1))
+        if cellY0 > cellY1:
+            (cellX0, cellY0, cellX1, cellY1) = (cellX1, cellY1, cellX0, cellY0)
+        isHorizontal = cellY1 == cellY0
+        columnsPerRow = 0 if isHorizontal else (cellX1 - cellX0) / (cellY1 - cellY0)
+        (lastColumn, lastRow) = (maskWidth - 1, maskHeight - 1)
+        rows = collisionMask.rows
+        for row in range(min(int(cellY0), lastRow), min(int(cellY1), lastRow) + 1):
+            # The part of the segment within this row
+            if isHorizontal:
+                (runStartX, runEndX) = (cellX0, cellX1)
+            else:
+                runStartX = cellX0 + (max(cellY0, row) - cellY0) * columnsPerRow
+                runEndX = cellX0 + (min(cellY1, row + 1) - cellY0) * columnsPerRow
+            if runStartX > runEndX:
+                (runStartX, runEndX) = (runEndX, runStartX)
+            firstColumn = min(max(int(runStartX), 0), lastColumn)
+            endColumn = min(max(int(runEndX), 0), lastColumn)
+            run = ((1 << (endColumn - firstColumn + 1)) - 1) << firstColumn
+            if rows[row] & run:
+                return True
         return False
 
-class DrawnImage(object):
-    def __init__(self, pilImage, boundingBox, backgroundColor, assertions = False):
-        self.pilImage = pilImage
-        self.boundingBox = boundingBox
-        self.backgroundColor = backgroundColor
-        self.assertions = assertions
-
-    def position_is_part_of_image(self, positionX: int, positionY: int) -> bool:
-        image = self.pilImage
-        (boxBottomLeft, boxTopRight) = self.boundingBox
-        (width, height) = (boxTopRight.x - boxBottomLeft.x, boxTopRight.y - boxBottomLeft.y)
-        (imageWidth, imageHeight) = (image.width -1, image.height - 1)
-        (relativeX, relativeY) = (positionX - boxBottomLeft.x, positionY - boxBottomLeft.y)
-        if ((relativeX > width or relativeX < 0) or
-            (relativeY > height or relativeY < 0)):
-            # Can happen due to rounding
-            return False
-        pixelX = (relativeX / width) * imageWidth
-        pixelY = (relativeY / height) * imageHeight
-        # Up is down
-        pixelY = imageHeight - pixelY
-        return image.getpixel((pixelX, pixelY)) != self.backgroundColor
+# An occupancy mask of a rendered sprite, built once when the sprite is produced
+# Each row is an integer bitmask, where bit i is set if column i is part of the sprite
+# Rows are stored top to bottom, in the same order as the image they were built from
+class CollisionMask(object):
+    def __init__(self, width: int, height: int, rows: list):
+        self.width = width
+        self.height = height
+        self.rows = rows
+
+    @staticmethod
+    def from_pil_image(pilImage, backgroundColor):
+        (width, height) = pilImage.size
+        pixels = list(pilImage.getdata())
+        rows = []
+        for rowStart in range(0, width * height, width):
+            row = 0
+            for column in range(width):
+                if pixels[rowStart + column] != backgroundColor:
+                    row |= 1 << column
+            rows.append(row)
+        return CollisionMask(width, height, rows)
 
 # Tests the Position class
 def testPosition() -> None:
     print("Testing testPosition()...")
     position1 = Position(1, 1)
     almostOne = 0.9999999999
-    assert position1 == Position(almostOne, almostOne), f"Equality precision"
+    assert position1 == Position(almostOne, almostOne), "Equality precision"
     assert position1.to_direction_radians() == math.pi / 4
     assert Position(-1, -1).to_direction_radians() == 5 * math.pi / 4
+    assert len({Position(1, 2), Position(2, 1)}) == 2, "Hash must depend on x"
+    assert Position(1, 2).translated(1, -1) == Position(2, 1)
     print("Passed")
 
 def assertEquals(expected, actual) -> None:
@@ -244,3 +250,20 @@ def testLineSegment() -> None:
     segment = LineSegment(Position(0, 0), Position(3, 6))
     assert segment.max_min_bounds() == ((3, 0), (6, 0))
     print("Passed")
+
+# Tests CollisionPath against a CollisionMask
+def testCollisionMask() -> None:
+    print("Testing testCollisionMask()...")
+    # Only the left-most column is part of the sprite
+    mask = CollisionMask(4, 4, [0b0001] * 4)
+    boundingBox = (Position(0, 0), Position(4, 4))
+    hitting = CollisionPath(Position(0.5, -2), Position(0.5, 6))
+    assert hitting.intersects_mask(mask, boundingBox)
+    missing = CollisionPath(Position(3.5, -2), Position(3.5, 6))
+    assert not missing.intersects_mask(mask, boundingBox)
+    # A single cell, crossed by a steep segment which sampling integer columns would skip
+    mask = CollisionMask(4, 4, [0b0000, 0b0100, 0b0000, 0b0000])
+    steep = CollisionPath(Position(2.1, 0), Position(2.9, 4))
+    assert steep.intersects_mask(mask, boundingBox)
+    assert not CollisionPath(Position(5, 0), Position(6, 4)).intersects_mask(mask, boundingBox)
+    print("Passed")
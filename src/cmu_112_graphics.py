@@ -271,13 +271,14 @@ class App(object):
     # Implementation:
     ####################################
 
-    def __init__(app, width=300, height=300, x=0, y=0, title=None, autorun=True, mvcCheck=True, logDrawingCalls=True):
+    def __init__(app, width=300, height=300, x=0, y=0, title=None, autorun=True, mvcCheck=True, logDrawingCalls=True, retainCanvas=False):
         app.winx, app.winy, app.width, app.height = x, y, width, height
         app.timerDelay = 100     # milliseconds
         app.mouseMovedDelay = 50 # ditto
         app._title = title
         app._mvcCheck = mvcCheck
         app._logDrawingCalls = logDrawingCalls
+        app._retainCanvas = retainCanvas # if True, redrawAll updates existing items itself
         app._running = app._paused = False
         app._mousePressedOutsideWindow = False
         if autorun: app.run()
@@ -406,9 +407,10 @@ class App(object):
         if (not app._running): return
         if ('deferredRedrawAll' in app._afterIdMap): return # wait for pending call
         app._canvas.inRedrawAll = True
-        app._canvas.delete(ALL)
-        width,outline = (10,'red') if app._paused else (0,'white')
-        app._canvas.create_rectangle(0, 0, app.width, app.height, fill='white', width=width, outline=outline)
+        if (not app._retainCanvas):
+            app._canvas.delete(ALL)
+            width,outline = (10,'red') if app._paused else (0,'white')
+            app._canvas.create_rectangle(0, 0, app.width, app.height, fill='white', width=width, outline=outline)
         app._canvas.loggedDrawingCalls = [ ]
         app._canvas.logDrawingCalls = app._logDrawingCalls
         hash1 = getHash(app) if app._mvcCheck else None
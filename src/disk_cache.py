@@ -0,0 +1,213 @@
+import hashlib, json, mmap, os, struct, threading
+from PIL import Image
+
+# Persists rendered images between launches, so that repeat startups and resizes
+# to a window size seen before skip decoding and transforming the source images
+#
+# Each viewport size has one pack file: a header, a JSON index, then the raw pixel
+# bytes of every image. Packs are memory-mapped, so stored images are read lazily
+# straight out of the page cache. Every entry records the hash of its source image,
+# so an entry is ignored once its source changes, and dropped when the pack is next written
+#
+# Packs are touched whenever they are read, and only the MAX_PACKS most recently
+# used are kept, so that resizing through many window sizes does not fill the disk
+#
+# Packs are stored on worker threads while the tkinter thread loads them
+class DiskImageCache(object):
+    MAGIC = b"GSPR"
+    VERSION = 1
+    HEADER = struct.Struct("<4sII") # magic, version, index length
+    MAX_PACKS = 8
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.sourceHashes = dict()
+        # Pack path -> (mapped data, index), loaded on first use
+        self.packs = dict()
+        # Guards sourceHashes and packs, and is not held while a pack is written
+        self.lock = threading.Lock()
+        # Held by the one store writing packs at a time
+        self.storeLock = threading.Lock()
+
+    def source_hash(self, sourcePath: str) -> str:
+        sourceHash = self.sourceHashes.get(sourcePath)
+        if sourceHash == None:
+            with open(sourcePath, "rb") as file:
+                sourceHash = hashlib.blake2b(file.read(), digest_size = 16).hexdigest()
+            self.sourceHashes[sourcePath] = sourceHash
+        return sourceHash
+
+    # Whether the source of a stored entry is unchanged
+    def is_current(self, entry) -> bool:
+        try:
+            return self.source_hash(entry["sourcePath"]) == entry["source"]
+        except OSError:
+            return False
+
+    def pack_path(self, viewport) -> str:
+        (r, g, b) = viewport.backgroundColor
+        return os.path.join(self.directory,
+                            f"sprites-{viewport.width}x{viewport.height}-{r:02x}{g:02x}{b:02x}.bin")
+
+    def load_pack(self, packPath: str):
+        pack = self.packs.get(packPath)
+        if pack == None:
+            pack = read_pack(packPath)
+            self.packs[packPath] = pack
+            try:
+                os.utime(packPath)
+            except OSError:
+                pass
+        return pack
+
+    # Looks up the images for the given ((id, handler), sourcePath) entries
+    # Returns a dict of (id, handler) -> pil image, holding only the stored images
+    def load(self, viewport, entries) -> dict:
+        images = dict()
+        with self.lock:
+            (buffer, index) = self.load_pack(self.pack_path(viewport))
+            for (key, sourcePath) in entries:
+                entry = index.get(entry_name(key))
+                if entry == None or not self.is_current(entry):
+                    continue
+                (offset, length) = (entry["offset"], entry["length"])
+                # Images are read-only views of the mapped pack, and are only copied once transformed
+                images[key] = Image.frombuffer(entry["mode"], tuple(entry["size"]),
+                                               buffer[offset:offset + length], "raw", entry["mode"], 0, 1)
+        return images
+
+    # Adds the given (((id, handler), sourcePath), pilImage) pairs to the viewport's pack
+    # The pack is rewritten to a new file, so images mapped from the former one stay valid
+    # The cache is best-effort: if the pack cannot be written, the images go unstored
+    # Once written, the least recently used packs beyond MAX_PACKS are deleted
+    def store(self, viewport, images) -> None:
+        packPath = self.pack_path(viewport)
+        temporaryPath = packPath + ".tmp"
+        with self.storeLock:
+            try:
+                chunks = dict()
+                with self.lock:
+                    (buffer, index) = self.load_pack(packPath)
+                    for (name, entry) in index.items():
+                        if self.is_current(entry):
+                            # Copied, so that nothing holds on to the former pack's mapping
+                            chunks[name] = (entry, bytes(buffer[entry["offset"]:entry["offset"] + entry["length"]]))
+                    for ((key, sourcePath), pilImage) in images:
+                        entry = { "source": self.source_hash(sourcePath), "sourcePath": sourcePath,
+                                  "mode": pilImage.mode, "size": list(pilImage.size) }
+                        chunks[entry_name(key)] = (entry, pilImage.tobytes())
+                os.makedirs(self.directory, exist_ok = True)
+                write_pack(temporaryPath, chunks)
+                with self.lock:
+                    # Some systems refuse to replace a file which is still mapped
+                    self.release_pack(packPath)
+                    os.replace(temporaryPath, packPath)
+                    self.packs[packPath] = read_pack(packPath)
+            except OSError:
+                try:
+                    os.remove(temporaryPath)
+                except OSError:
+                    pass
+                return
+            self.prune()
+
+    # Deletes all but the MAX_PACKS most recently used packs
+    def prune(self) -> None:
+        try:
+            names = [ name for name in os.listdir(self.directory)
+                      if name.startswith("sprites-") and name.endswith(".bin") ]
+            packPaths = sorted((os.path.join(self.directory, name) for name in names),
+                               key = os.path.getmtime, reverse = True)
+        except OSError:
+            return
+        for packPath in packPaths[DiskImageCache.MAX_PACKS:]:
+            with self.lock:
+                self.release_pack(packPath)
+            try:
+                os.remove(packPath)
+            except OSError:
+                pass
+
+    # Forgets the pack, unmapping it unless images read from it are still in use
+    def release_pack(self, packPath: str) -> None:
+        pack = self.packs.pop(packPath, None)
+        if pack == None or not isinstance(pack[0], memoryview):
+            return
+        (buffer, _) = pack
+        mapping = buffer.obj
+        buffer.release()
+        try:
+            mapping.close()
+        except BufferError:
+            # Stored images still view the mapping, which then stays open until they are gone
+            pass
+
+# The name of a stored image, stable between launches
+def entry_name(key) -> str:
+    (id, handler) = key
+    return f"{id!r}|{handler.cache_key()!r}"
+
+# Returns (data, index) of the pack, or an empty pack if it is missing or unreadable
+# Offsets in the index are relative to the data, which follows the index
+def read_pack(packPath: str):
+    try:
+        with open(packPath, "rb") as file:
+            buffer = memoryview(mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ))
+        (magic, version, indexLength) = DiskImageCache.HEADER.unpack_from(buffer)
+        if magic != DiskImageCache.MAGIC or version != DiskImageCache.VERSION:
+            return (b"", dict())
+        indexStart = DiskImageCache.HEADER.size
+        index = json.loads(bytes(buffer[indexStart:indexStart + indexLength]))
+        return (buffer[indexStart + indexLength:], index)
+    except (OSError, ValueError, struct.error):
+        return (b"", dict())
+
+def write_pack(packPath: str, chunks: dict) -> None:
+    index = dict()
+    offset = 0
+    for (name, (entry, data)) in chunks.items():
+        index[name] = dict(entry, offset = offset, length = len(data))
+        offset += len(data)
+    indexBytes = json.dumps(index).encode("utf-8")
+    with open(packPath, "wb") as file:
+        file.write(DiskImageCache.HEADER.pack(DiskImageCache.MAGIC, DiskImageCache.VERSION, len(indexBytes)))
+        file.write(indexBytes)
+        for (entry, data) in chunks.values():
+            file.write(data)
+
+# Tests that stored images are read back, ignored once their source changes, that
+# unused packs are pruned, and that a pack which cannot be written is not an error
+def testDiskImageCache() -> None:
+    print("Testing testDiskImageCache()...")
+    import shutil, tempfile
+    from board import Viewport
+    from image_cache import ImageResizer
+    directory = tempfile.mkdtemp()
+    try:
+        sourcePath = os.path.join(directory, "bee.png")
+        Image.new("RGB", (4, 4), (255, 0, 0)).save(sourcePath)
+        viewport = Viewport(448, 576, (0, 0, 0))
+        key = ("bee", ImageResizer((2, 2)))
+        cache = DiskImageCache(os.path.join(directory, "cache"))
+        cache.store(viewport, [ ((key, sourcePath), Image.new("RGB", (2, 2), (1, 2, 3))) ])
+        images = DiskImageCache(cache.directory).load(viewport, [ (key, sourcePath) ])
+        assert images[key].getpixel((1, 1)) == (1, 2, 3), f"Really {images}"
+        Image.new("RGB", (4, 4), (0, 255, 0)).save(sourcePath)
+        assert DiskImageCache(cache.directory).load(viewport, [ (key, sourcePath) ]) == dict()
+        # Along with the pack above, this fills the cache; packs are then pruned least
+        # recently used first, and reading a pack uses it
+        viewports = [ Viewport(width, 576, (0, 0, 0)) for width in range(1, DiskImageCache.MAX_PACKS + 1) ]
+        for (time, viewport) in enumerate(viewports[:-1]):
+            cache.store(viewport, [ ((key, sourcePath), Image.new("RGB", (2, 2))) ])
+            os.utime(cache.pack_path(viewport), (time, time))
+        DiskImageCache(cache.directory).load(viewports[0], [ (key, sourcePath) ])
+        cache.store(viewports[-1], [ ((key, sourcePath), Image.new("RGB", (2, 2))) ])
+        assert len(os.listdir(cache.directory)) == DiskImageCache.MAX_PACKS
+        assert os.path.exists(cache.pack_path(viewports[0]))
+        assert not os.path.exists(cache.pack_path(viewports[1]))
+        unwritable = DiskImageCache(os.path.join(sourcePath, "cache"))
+        unwritable.store(viewport, [ ((key, sourcePath), Image.new("RGB", (2, 2))) ])
+        assert unwritable.load(viewport, [ (key, sourcePath) ]) == dict()
+    finally:
+        shutil.rmtree(directory)
+    print("Passed")
@@ -0,0 +1,212 @@
+from alien import *
+from board import *
+from entity import *
+from game import *
+from gallery import Gallery
+from levels import Campaign
+from profiler import Profiler
+from replay import Recording
+from snapshot import Snapshot
+import argparse, random, time
+
+from image_cache import ROTATION_BUCKETS, UPRIGHT_BUCKET, sprite_handler
+from sprite import SPRITES, STARSHIP_SPRITE, BEE_SPRITE, BOSS_SPRITE
+
+# Sprites which appear in play, and so are loaded before it starts
+PRELOADED_SPRITES = [ STARSHIP_SPRITE, BEE_SPRITE, BOSS_SPRITE ]
+
+# The (id, handler) pair of every image drawn during play: each heading of the
+# sprites which turn as they dance, the others upright, and every animation
+# frame at each sprite size, since any sprite may explode
+def preload_manifest(sprites = PRELOADED_SPRITES, animations = None) -> list:
+    if animations == None:
+        animations = SPRITES.animations.values()
+    manifest = []
+    for sprite in sprites:
+        buckets = range(ROTATION_BUCKETS) if sprite.rotates else [ UPRIGHT_BUCKET ]
+        manifest += [ (sprite.imageId, sprite_handler(sprite.dimensions, bucket)) for bucket in buckets ]
+    for dimensions in { sprite.dimensions for sprite in sprites }:
+        handler = sprite_handler(dimensions, UPRIGHT_BUCKET)
+        for animation in animations:
+            manifest += [ (frame, handler) for frame in animation.frames ]
+    return manifest
+
+# Player inputs, which are all the game needs besides its seed to be replayed
+INPUT_MOVE_LEFT = 0
+INPUT_MOVE_RIGHT = 1
+INPUT_FIRE = 2
+
+# The simulation core. Independent of tkinter, so it can also run headless
+class Galaga(object):
+    # seed is the seed of the game's rng, if known, so that the session can be recorded
+    def __init__(self, game, gallery, campaign, seed = None):
+        self.game = game
+        self.gallery = gallery
+        self.currentLevel = 0
+        self.score = 0
+        self.campaign = campaign
+        # Spawn batches of the current level which are yet to spawn, and the tick it began
+        self.pendingBatches = []
+        self.levelStartTick = 0
+        self.state = 0 # 0 - playing, 1 - game over, 2 - victory
+        self.profiler = Profiler()
+        self.seed = seed
+        self.tickCount = 0
+        # Records each input with the tick it happened before, if set
+        self.recorder = None
+
+    # Applies an INPUT_ constant, unless the game is over
+    def handle_input(self, playerInput: int) -> None:
+        if self.stop_controls():
+            return
+        if self.recorder != None:
+            self.recorder.record(self.tickCount, playerInput)
+        if playerInput == INPUT_MOVE_LEFT:
+            self.game.move_each_starship(-1)
+        elif playerInput == INPUT_MOVE_RIGHT:
+            self.game.move_each_starship(1)
+        elif playerInput == INPUT_FIRE:
+            self.game.fire_starship_shot()
+
+    def tick(self) -> None:
+        self.tickCount += 1
+        game = self.game
+        profiler = self.profiler
+        tickStart = profiler.start()
+        game.regulator.tick()
+        game.tick(self)
+        if game.regulator.should_cleanup_entities():
+            phaseStart = profiler.start()
+            game.cleanup_entities()
+            profiler.stop("cleanup", phaseStart)
+        self.harangue_aliens_to_action()
+        profiler.stop("tick", tickStart)
+
+    def harangue_aliens_to_action(self) -> None:
+        game = self.game
+        phaseStart = self.profiler.start()
+        self.game.dance_aliens()
+        self.profiler.stop("dance", phaseStart)
+        if (game.regulator.should_spawn_aliens() and len(game.aliens) == 0
+                and len(self.pendingBatches) == 0):
+            level = self.campaign.level(self.currentLevel)
+            if level == None:
+                # Don't end the game if we already died
+                if self.state == 0:
+                    self.state = 2
+                return
+            self.pendingBatches = list(level.batches)
+            self.levelStartTick = game.regulator.timeSinceLevelStart
+            self.currentLevel += 1
+            self.score += 10
+        self.spawn_due_batches()
+
+    def spawn_due_batches(self) -> None:
+        pendingBatches = self.pendingBatches
+        if len(pendingBatches) == 0:
+            return
+        ticksIntoLevel = self.game.regulator.timeSinceLevelStart - self.levelStartTick
+        while len(pendingBatches) > 0 and pendingBatches[0].delay <= ticksIntoLevel:
+            for alien in pendingBatches.pop(0).spawn(self):
+                self.game.add_alien(alien)
+
+    def game_over(self) -> None:
+        self.state = 1
+
+    def stop_controls(self) -> bool:
+        return self.title_overlay() != None
+
+    # If won or game over, returns a title, otherwise None
+    def title_overlay(self) -> str:
+        if self.state == 1:
+            return "Game Over"
+        if self.state == 2:
+            return "Victory"
+        return None
+
+# Without a seed, a random one is chosen, and kept as galaga.seed
+def new_galaga(gallery, campaign, seed = None):
+    if seed == None:
+        seed = random.randrange(2**32)
+    starship = Starship(Position(112, 15))
+    game = Game(GameplayRegulator(), starship, random.Random(seed))
+    return Galaga(game, gallery, campaign, seed)
+
+# Resumes the session a snapshot was taken of, as it was at the end of that tick
+def resume_galaga(snapshot, gallery, campaign):
+    galaga = Galaga(snapshot.restore_game(), gallery, campaign)
+    snapshot.restore_progress(galaga)
+    return galaga
+
+# Advances the simulation by the given amount of ticks as fast as possible
+# Returns the elapsed wall time in seconds
+def run_headless(galaga, ticks: int) -> float:
+    start = time.perf_counter()
+    for _ in range(ticks):
+        galaga.tick()
+    return time.perf_counter() - start
+
+# Replays a recorded session as fast as possible, applying each input before the
+# tick it was recorded at. Replays from the start, or from a galaga resumed part way
+# through the session, until the end of the recording or the given tick
+# Returns (galaga, elapsed wall time in seconds)
+def replay_headless(recording, gallery, campaign, galaga = None, untilTick = None):
+    if galaga == None:
+        galaga = new_galaga(gallery, campaign, recording.seed)
+    elif galaga.seed != recording.seed:
+        raise ValueError(f"The recording has seed {recording.seed}, not {galaga.seed}")
+    endTick = recording.tickCount if untilTick == None else min(untilTick, recording.tickCount)
+    # Keep every tick's timing, so the whole run's distribution can be compared
+    galaga.profiler = Profiler(windowSize = max(endTick - galaga.tickCount, 1))
+    inputs = recording.inputs
+    nextInput = 0
+    # Inputs before the tick resumed from were applied before the snapshot was taken
+    while nextInput < len(inputs) and inputs[nextInput][0] < galaga.tickCount:
+        nextInput += 1
+    start = time.perf_counter()
+    while galaga.tickCount < endTick:
+        while nextInput < len(inputs) and inputs[nextInput][0] <= galaga.tickCount:
+            galaga.handle_input(inputs[nextInput][1])
+            nextInput += 1
+        galaga.tick()
+    return (galaga, time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description = "Runs Galaga without a display")
+    parser.add_argument("--ticks", type = int,
+                        help = "ticks to run, by default 10000, or the rest of a replay")
+    parser.add_argument("--images", default = "images")
+    parser.add_argument("--levels", default = "levels/campaign.json")
+    parser.add_argument("--seed", type = int)
+    parser.add_argument("--replay", help = "replay the session recorded in this file")
+    parser.add_argument("--snapshot", help = "resume from the snapshot in this file")
+    parser.add_argument("--save-snapshot", help = "write a snapshot of the state after running to this file")
+    parser.add_argument("--profile", help = "export the profiler report to this .json or .csv file")
+    args = parser.parse_args()
+    (gallery, campaign) = (Gallery(args.images), Campaign.load(args.levels))
+    galaga = None
+    if args.snapshot != None:
+        galaga = resume_galaga(Snapshot.read(args.snapshot), gallery, campaign)
+    startTick = galaga.tickCount if galaga != None else 0
+    if args.replay != None:
+        recording = Recording.read(args.replay)
+        untilTick = startTick + args.ticks if args.ticks != None else None
+        (galaga, elapsed) = replay_headless(recording, gallery, campaign, galaga, untilTick)
+    else:
+        if galaga == None:
+            galaga = new_galaga(gallery, campaign, args.seed)
+        elapsed = run_headless(galaga, args.ticks if args.ticks != None else 10000)
+    ticks = galaga.tickCount - startTick
+    print(f"Ran {ticks} ticks in {elapsed:.3f}s ({ticks / elapsed:.0f} ticks per second)")
+    print(f"Level: {galaga.currentLevel}  Score: {galaga.score}  State: {galaga.state}")
+    tick = galaga.profiler.report(galaga)["phases"].get("tick")
+    if tick != None:
+        print(f"Tick: p50 {tick['p50Ms']:.3f}ms  p95 {tick['p95Ms']:.3f}ms  p99 {tick['p99Ms']:.3f}ms")
+    if args.profile != None:
+        galaga.profiler.export(args.profile, galaga)
+    if args.save_snapshot != None:
+        Snapshot.capture(galaga).write(args.save_snapshot)
+        print(f"Saved a snapshot of tick {galaga.tickCount} to {args.save_snapshot}")
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,82 @@
 
-import math, random
-from board import Position, Direction, LineSegment, CollisionPath, DrawnImage
-from image_cache import ImageResizer, ImageRotator, CombinedImageHandler
-
+from board import Position, Direction
+from image_cache import ROTATION_BUCKETS, UPRIGHT_BUCKET, sprite_handler
+from shot_pool import FACTION_STARSHIP, FACTION_ALIEN
+from sprite import STARSHIP_SPRITE, EXPLOSION_ANIMATION
+
+# The render state of a single entity: which image of its shared sprite it shows,
+# and at which heading. Keeps direct references to its current images, which are
+# only looked up again once the image or rotation changes, or the gallery rescales
 class Shape(object):
-    def __init__(self, id: str, dimensions: (int, int)):
-        self.id = id
-        self.dimensions = dimensions
-        self.pilImage = None
-        self.backgroundColor = None
-        self.rotation = Direction(math.pi / 2)
-
+    __slots__ = ("sprite", "id", "rotationBucket", "dirty", "imageHandler",
+                 "collisionMask", "tkinterImage", "imageGeneration")
+
+    def __init__(self, sprite):
+        self.sprite = sprite
+        self.id = sprite.imageId
+        self.rotationBucket = UPRIGHT_BUCKET
+        self.tkinterImage = None
+        self.imageGeneration = None
+        self.mark_dirty()
+
+    def mark_dirty(self) -> None:
+        self.dirty = True
+        self.imageHandler = None
+        self.collisionMask = None
+
+    # Overrides the sprite's image for this entity only, such as while it explodes
     def set_image_id(self, newId) -> None:
+        if newId == self.id:
+            return
         self.id = newId
-        self.pilImage = None
+        self.mark_dirty()
+
+    # Shows the frame of the animation with the given index, drawn upright
+    # so that every entity shares the same pre-scaled frames
+    def set_frame(self, animation, index: int) -> None:
+        frame = animation.frames[index]
+        if frame == self.id and self.rotationBucket == UPRIGHT_BUCKET:
+            return
+        self.id = frame
+        self.rotationBucket = UPRIGHT_BUCKET
+        self.mark_dirty()
 
+    # Headings are quantized, so small changes of heading keep the same image
     def set_rotation(self, newRotation) -> None:
-        self.rotation = newRotation
-        self.pilImage = None
+        self.set_rotation_bucket(newRotation.bucket(ROTATION_BUCKETS))
+
+    def set_rotation_bucket(self, newBucket: int) -> None:
+        if newBucket == self.rotationBucket:
+            return
+        self.rotationBucket = newBucket
+        self.mark_dirty()
+
+    def image_handler(self):
+        if self.imageHandler == None:
+            self.imageHandler = sprite_handler(self.sprite.dimensions, self.rotationBucket)
+        return self.imageHandler
 
     def get_tkinter_image(self, app):
-        imageHandler = CombinedImageHandler(ImageRotator(self.rotation), ImageResizer(self.dimensions))
-        pilImage = app.galaga.gallery.get_pil_image(app, self.id, imageHandler)
-        tkinterImage = app.galaga.gallery.get_tkinter_image(app, self.id, imageHandler, pilImage)
-        self.pilImage = pilImage
-        self.backgroundColor = app.backgroundColor
-        return tkinterImage
+        gallery = app.galaga.gallery
+        if self.dirty or self.imageGeneration != gallery.generation:
+            imageHandler = self.image_handler()
+            pilImage = gallery.get_pil_image(app, self.id, imageHandler)
+            self.tkinterImage = gallery.get_tkinter_image(app, self.id, imageHandler, pilImage)
+            self.imageGeneration = gallery.generation
+            self.dirty = False
+        return self.tkinterImage
 
     def rectangular_dimensions(self):
-        return self.dimensions
+        return self.sprite.dimensions
 
-    def obtain_image_and_background(self):
-        pilImage = self.pilImage
-        if pilImage == None:
-            return (None, None)
-        return (pilImage, self.backgroundColor)
+    # Masks are independent of drawing, so they are available before the first frame
+    def obtain_collision_mask(self, gallery):
+        if self.collisionMask == None:
+            self.collisionMask = gallery.get_collision_mask(self.id, self.image_handler())
+        return self.collisionMask
 
 class LifeStatus(object):
-    MAX_DEATH_ANIMATION = 20
+    MAX_DEATH_ANIMATION = len(EXPLOSION_ANIMATION)
 
     def __init__(self, deathAnimationSpeed):
         self.alive = True
@@ -52,8 +91,7 @@ class LifeStatus(object):
         newAnimationStage = self.deathAnimationTick // self.deathAnimationSpeed
         if (formerAnimationStage != newAnimationStage and
             newAnimationStage < LifeStatus.MAX_DEATH_ANIMATION):
-            imageName = "row-" + str(1 + newAnimationStage // 5) + "-column-" + str(1 + newAnimationStage % 5)
-            shape.set_image_id("death-animations/" + imageName)
+            shape.set_frame(EXPLOSION_ANIMATION, newAnimationStage)
 
     def is_finished(self):
         animationStage = self.deathAnimationTick // self.deathAnimationSpeed
@@ -69,29 +107,22 @@ class Entity(object):
     def is_alive(self) -> bool:
         return self.lifeStatus.alive
 
-    def draw_on(self, app, canvas) -> None:
+    def draw_on(self, app, canvas, item) -> None:
         (x, y) = self.position.to_canvas_coords(app)
-        canvas.create_image(x, y, image = self.shape.get_tkinter_image(app))
+        item.show_image(canvas, x, y, self.shape.get_tkinter_image(app))
 
     def rectangular_bounding_box(self, atPosition = None):
         if atPosition == None:
             atPosition = self.position
         (boxWidth, boxHeight) = self.shape.rectangular_dimensions()
-        shapeBottomLeft = atPosition - Position(boxWidth / 2, boxHeight / 2)
-        shapeTopRight = shapeBottomLeft + Position(boxWidth, boxHeight)
+        (halfWidth, halfHeight) = (boxWidth / 2, boxHeight / 2)
+        shapeBottomLeft = atPosition.translated(-halfWidth, -halfHeight)
+        shapeTopRight = atPosition.translated(halfWidth, halfHeight)
         return (shapeBottomLeft, shapeTopRight)
 
-    def collides_with(self, collisionPath) -> bool:
-        (pilImage, backgroundColor) = self.shape.obtain_image_and_background()
-        if pilImage == None:
-            # We haven't drawn yet. This can happen in two scenarios:
-            # 1. The game has just begun
-            # 2. We are in an image transition
-            # In either case, the shape hasn't rendered yet
-            return False
-        boundingBox = self.rectangular_bounding_box()
-        image = DrawnImage(pilImage, boundingBox, backgroundColor)
-        return collisionPath.intersects_with_image(image)
+    def collides_with(self, collisionPath, gallery) -> bool:
+        collisionMask = self.shape.obtain_collision_mask(gallery)
+        return collisionPath.intersects_mask(collisionMask, self.rectangular_bounding_box())
 
     def could_be_located_at(self, newPosition) -> None:
         (shapeBottomLeft, shapeTopRight) = self.rectangular_bounding_box(newPosition)
@@ -99,8 +130,7 @@ class Entity(object):
 
     def destroy(self) -> None:
         self.lifeStatus.alive = False
-        # From https://www.hiclipart.com/free-transparent-background-png-clipart-beklu
-        self.shape.set_image_id("death-animations/row-1-column-1")
+        self.shape.set_frame(EXPLOSION_ANIMATION, 0)
 
     def tick(self) -> None:
         self.lifeStatus.tick_and_adjust_shape(self.shape)
@@ -109,29 +139,27 @@ class Entity(object):
         return self.lifeStatus.is_finished()
 
 class Starship(Entity):
-
-    STARSHIP_SHAPE = Shape("starship", (16, 16))
-
     def __init__(self, initialPosition):
-        super().__init__(initialPosition, Starship.STARSHIP_SHAPE, LifeStatus(5))
+        super().__init__(initialPosition, Shape(STARSHIP_SPRITE), LifeStatus(5))
 
     # Moves this starship by the given amount of galaga pixels
     def move_by(self, xshift: int) -> None:
-        self.position += Position(xshift, 0)
+        self.position = self.position.translated(xshift, 0)
 
     # Determines whether this starship would be able to move by the given amount
     def can_move_by(self, xshift: int) -> bool:
-        return self.could_be_located_at(self.position + Position(xshift, 0))
+        return self.could_be_located_at(self.position.translated(xshift, 0))
 
     def __repr__(self):
         return f"Starship(position={self.position})"
 
+    # Returns (position, direction, faction) of a new shot
     def create_shot(self):
-        return Shot(self.position, (0, 1), lambda eType: eType == Alien)
+        return (self.position, (0, 1), FACTION_STARSHIP)
 
 class Alien(Entity):
     def __init__(self, initialPosition, positionAtRest, alienSoul):
-        super().__init__(initialPosition, alienSoul.shape, LifeStatus(1))
+        super().__init__(initialPosition, Shape(alienSoul.sprite), LifeStatus(1))
         self.positionAtRest = positionAtRest
         self.alienSoul = alienSoul
         alienSoul.initialize_entity(self)
@@ -145,9 +173,10 @@ class Alien(Entity):
     def __repr__(self):
         return f"Alien(position={self.position})"
 
-    def create_shot(self):
-        xdirection = (random.random() - 0.5) / 4
-        return Shot(self.position, (xdirection, -1), lambda eType: eType == Starship)
+    # Returns (position, direction, faction) of a new shot, which drifts by the given rng
+    def create_shot(self, rng):
+        xdirection = (rng.random() - 0.5) / 4
+        return (self.position, (xdirection, -1), FACTION_ALIEN)
 
     def score_when_killed(self, currentLevel: int) -> int:
         return self.alienSoul.score_when_killed(currentLevel)
@@ -155,27 +184,18 @@ class Alien(Entity):
     def shot_creation_chance(self) -> int:
         return self.alienSoul.shot_creation_chance()
 
-class Shot(object):
-    def __init__(self, initialPosition, direction, affectsWhichEntities):
-        self.position = initialPosition
-        self.direction = direction
-        self.affectsWhichEntities = affectsWhichEntities
-
-    def affects_entity_type(self, entityType) -> bool:
-        return self.affectsWhichEntities(entityType)
-
-    def move(self, byPixels: int):
-        oldPosition = self.position
-        newPosition = oldPosition + Position(*self.direction) * byPixels
-        self.position = newPosition
-        return CollisionPath(oldPosition, newPosition)
-
-    def draw_on(self, app, canvas) -> None:
-        (x1, y1) = self.position.to_canvas_coords(app)
-        (x2, y2) = (self.position + Position(1, 1)).to_canvas_coords(app)
-        (directionX, directionY) = self.direction
-        color = "red" if directionY <= 0 else "blue"
-        canvas.create_rectangle(x1, y1, x2, y2, fill = color, outline = color)
-
-    def tick(self) -> None:
-        pass
+# Tests that entities sharing a sprite keep their own render state
+def testShape() -> None:
+    print("Testing testShape()...")
+    (first, second) = (Starship(Position(20, 15)), Starship(Position(40, 15)))
+    assert first.shape is not second.shape
+    assert first.shape.sprite is second.shape.sprite
+    first.destroy()
+    assert second.shape.id == STARSHIP_SPRITE.imageId, f"Really {second.shape.id}"
+    assert first.shape.id == EXPLOSION_ANIMATION.frames[0]
+    # Shapes at the same heading share one handler, and so the same cached images
+    second.shape.set_rotation(Direction(0))
+    third = Shape(STARSHIP_SPRITE)
+    third.set_rotation(Direction(0.01))
+    assert second.shape.image_handler() is third.image_handler()
+    print("Passed")
@@ -0,0 +1,59 @@
+from image_cache import ROTATION_BUCKETS
+
+# Aliens whose dance stages move in lockstep, so they share a single stage and are
+# stepped together: the step and the heading are worked out once for the whole group,
+# then every member is moved by the same delta and turned to the same rotation bucket
+# Stages in lockstep move independently of position and never cede (see formation_key)
+class Formation(object):
+    def __init__(self, stage, tick: int):
+        self.stage = stage
+        self.members = []
+        # The last dance tick this formation stepped on; aliens only join a formation
+        # which has already stepped on the tick they finished their own step
+        self.lastStepTick = tick
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def can_join(self, alien, tick: int) -> bool:
+        return (self.lastStepTick == tick
+                and self.stage.formation_key() == alien.dance_stage.formation_key())
+
+    def join(self, alien) -> None:
+        alien.dance_stage = self.stage
+        self.members.append(alien)
+
+    # Steps every living member, forgetting the dead
+    def step(self, tick: int) -> None:
+        (positionDelta, _) = self.stage.advance(None)
+        (dx, dy) = (positionDelta.x, positionDelta.y)
+        bucket = positionDelta.to_direction().bucket(ROTATION_BUCKETS)
+        members = [ alien for alien in self.members if alien.is_alive() ]
+        for alien in members:
+            alien.position = alien.position.translated(dx, dy)
+            alien.shape.set_rotation_bucket(bucket)
+        self.members = members
+        self.lastStepTick = tick
+
+# Tests that members of a formation step together, and that the dead are dropped
+def testFormation() -> None:
+    print("Testing testFormation()...")
+    from alien import BeeSoul, BeeBackAndForth
+    from board import Position
+    from entity import Alien
+    aliens = [ Alien(Position(x, 100), Position(x, 100), BeeSoul()) for x in (20, 40, 60) ]
+    formation = Formation(BeeBackAndForth(5), 0)
+    for alien in aliens:
+        alien.dance_stage = BeeBackAndForth(5)
+        assert formation.can_join(alien, 0)
+        formation.join(alien)
+    aliens[1].lifeStatus.alive = False
+    for tick in range(4, 28, 4):
+        formation.step(tick)
+    assert len(formation) == 2, f"Really {len(formation)}"
+    assert [ alien.position.x for alien in aliens ] == [ 24, 40, 64 ], f"Really {aliens}"
+    straggler = Alien(Position(80, 100), Position(80, 100), BeeSoul())
+    straggler.dance_stage = BeeBackAndForth(5)
+    assert not formation.can_join(straggler, 24)
+    assert not formation.can_join(straggler, 20)
+    print("Passed")
@@ -3,84 +3,85 @@ from alien import *
 from board import *
 from entity import *
 from game import *
+from engine import new_galaga, preload_manifest
+from replay import InputRecorder, testRecording, testReplayInFreshProcess
+from scheduler import testAlienScheduler
+from formation import testFormation
+from spatial_index import testSpatialGrid
+from snapshot import testSnapshot
+from shot_density import testShotDensityIndex
+from shot_pool import testShotPool
+from path_table import testKeyframeTable
+from disk_cache import DiskImageCache, testDiskImageCache
+from gallery import Gallery
+from levels import Campaign, testCampaign
+from image_cache import LruCache, estimate_size_in_bytes, testLruCache
 from gui import *
+from renderer import Renderer
+from timing import FixedTimestep, testFixedTimestep
 from cmu_112_graphics import *
-
-class Galaga(object):
-    def __init__(self, game, gallery, waitingAliens):
-        self.game = game
-        self.gallery = gallery
-        self.currentLevel = 0
-        self.score = 0
-        self.waitingAliens = waitingAliens
-        self.state = 0 # 0 - playing, 1 - game over, 2 - victory
-
-    def tick(self, app) -> None:
-        game = self.game
-        game.regulator.tick()
-        game.tick(app)
-        if game.regulator.should_cleanup_entities():
-            game.cleanup_entities()
-        self.harangue_aliens_to_action()
-
-    def harangue_aliens_to_action(self) -> None:
-        game = self.game
-        if game.regulator.should_dance_aliens():
-            self.game.dance_aliens()
-        if game.regulator.should_spawn_aliens() and len(game.aliens) == 0:
-            waitingAliens = self.waitingAliens
-            if len(waitingAliens) == 0:
-                # Don't end the game if we already died
-                if self.state == 0:
-                    self.state = 2
-                return
-            nextUp = waitingAliens.pop()
-            for alien in nextUp(self):
-                self.game.add_alien(alien)
-            self.currentLevel += 1
-            self.score += 10
-
-    def game_over(self) -> None:
-        self.state = 1
-
-    def stop_controls(self) -> bool:
-        return self.title_overlay() != None
-
-    # If won or game over, returns a title, otherwise None
-    def title_overlay(self) -> str:
-        if self.state == 1:
-            return "Game Over"
-        if self.state == 2:
-            return "Victory"
-        return None
+import argparse
 
 def main():
-    def gen_bee(endPosition):
-        return Alien(Position.board_top_left(), endPosition, BeeSoul())
-    def gen_boss(endPosition, galaga):
-        return Alien(endPosition, endPosition, BossSoul(galaga.game))
-    waitingAliens = [
-        lambda galaga: [ gen_bee(Position(x, 220)) for x in range(32, 200, 32) ] + [ gen_boss(Position(112, 250), galaga) ],
-        lambda galaga: [ gen_bee(Position(x, 220)) for x in range(32, 200, 64) ],
-        lambda galaga: [ gen_bee(Position(32, 220)) ]
-    ]
-    starship = Starship(Position(112, 15))
-    galaga = Galaga(Game(GameplayRegulator(), starship), Gallery("images"), waitingAliens)
-    app = runApp(fnPrefix = 'galaga_', autorun = False, mvcCheck = False, logDrawingCalls = False)
-    app.timerDelay = 10 # 100 ticks per second
-    app.backgroundColor = (0, 0, 0)
+    parser = argparse.ArgumentParser(description = "Plays Galaga")
+    parser.add_argument("--seed", type = int)
+    parser.add_argument("--levels", default = "levels/campaign.json")
+    parser.add_argument("--record", help = "record the session to this file, for engine.py --replay")
+    args = parser.parse_args()
+    # Bound the derived image caches, as every new heading renders new images
+    newCache = lambda: LruCache(maxEntries = 1024, maxBytes = 64 * 2**20,
+                                sizeOf = estimate_size_in_bytes)
+    # Scaled images are kept on disk, so later launches skip rendering them
+    diskCache = DiskImageCache(".sprite-cache")
+    gallery = Gallery("images", newCache = newCache, diskCache = diskCache)
+    galaga = new_galaga(gallery, Campaign.load(args.levels), args.seed)
+    if args.record != None:
+        galaga.recorder = InputRecorder(args.record, galaga.seed)
+    # Decode every image and render its collision mask before the window opens
+    preloadStart = galaga.profiler.start()
+    galaga.gallery.preload_sources(preload_manifest())
+    elapsed = galaga.profiler.stop("preloadSources", preloadStart)
+    print(f"Preloaded image sources in {elapsed * 1000:.0f}ms")
+    app = runApp(fnPrefix = 'galaga_', autorun = False, mvcCheck = False, logDrawingCalls = False,
+                 retainCanvas = True)
+    # The timer only polls: ticks and frames are scheduled by the timestep
+    app.timerDelay = 5
+    app.timestep = FixedTimestep(ticksPerSecond = 100, framesPerSecond = 60)
+    app.backgroundColor = galaga.gallery.backgroundColor
     app.galaga = galaga
+    app.renderer = Renderer()
     app.run()
 
 def galaga_timerFired(app) -> None:
     galaga = app.galaga
-    if not galaga.game.regulator.isDebugging:
-        galaga.tick(app)
+    galaga.gallery.poll_rescale()
+    if is_preloading(app) and not galaga.gallery.is_rescaling():
+        finish_preload(app)
+    # Always ask for the due ticks, so that leaving debugging mode or preloading does not run a backlog
+    ticks = app.timestep.ticks_due()
+    if not (is_preloading(app) or galaga.game.regulator.isDebugging):
+        for _ in range(ticks):
+            galaga.tick()
 
 def testAll() -> None:
     testPosition()
     testLineSegment()
+    testCollisionMask()
+    testSpatialGrid()
+    testLruCache()
+    testFixedTimestep()
     testBeeSpiral()
+    testShape()
+    testRecording()
+    testReplayInFreshProcess()
+    testAlienScheduler()
+    testFormation()
+    testSnapshot()
+    testShotDensityIndex()
+    testShotPool()
+    testKeyframeTable()
+    testCampaign()
+    testDiskImageCache()
     print("All tests passed")
 
 #testAll()
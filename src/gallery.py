@@ -0,0 +1,259 @@
+import board
+from concurrent.futures import ThreadPoolExecutor
+from board import CollisionMask, Viewport
+from image_cache import Cache
+from PIL import Image
+from sprite import SheetFrame
+
+try: from PIL import ImageTk
+except ImportError: ImageTk = None # Running headless, without tkinter
+
+# Collision masks are rendered at this many cells per galaga pixel
+MASK_RESOLUTION = 4
+
+class Gallery(object):
+
+    # newCache creates the caches of derived images and masks, which may be bounded
+    # diskCache optionally keeps preloaded and rescaled images between launches
+    def __init__(self, imageDir: str, backgroundColor = (0, 0, 0), newCache = Cache,
+                 diskCache = None):
+        self.imageDir = imageDir
+        self.diskCache = diskCache
+        self.backgroundColor = backgroundColor
+        self.newCache = newCache
+        self.rawPilImageCache = Cache()
+        self.pilImageCache = newCache()
+        self.tkImageCache = newCache()
+        self.maskPilImageCache = newCache()
+        self.collisionMaskCache = newCache()
+        # Masks do not depend on the window, so they are rendered in a fixed viewport
+        self.maskViewport = Viewport(board.MAX_PIXEL_X * MASK_RESOLUTION,
+                                     board.MAX_PIXEL_Y * MASK_RESOLUTION,
+                                     backgroundColor)
+        # Incremented whenever the scaled images are replaced
+        self.generation = 0
+        # Worker threads for preloading and rescaling, created on first use
+        self.executor = None
+        self.pendingRescale = None
+        # The (id, handler) pairs always kept rendered, regardless of what has been drawn
+        self.manifest = []
+
+    def image_path(self, id: str) -> str:
+        return f"{self.imageDir}/{id}.png"
+
+    def source_id(self, id) -> str:
+        return id.sheetId if isinstance(id, SheetFrame) else id
+
+    def get_raw_pil_image(self, id):
+        return self.rawPilImageCache.get_or_load(id, self.load_raw_pil_image)
+
+    # Each sprite sheet is opened once, and its frames are sliced out of the cached sheet
+    def load_raw_pil_image(self, id):
+        if isinstance(id, SheetFrame):
+            return self.get_raw_pil_image(id.sheetId).crop(id.box)
+        return decode_image(self.image_path(id))
+
+    # Applies the handler to the raw image, caching the intermediate images as well
+    def render_pil_image(self, viewport, cache, id: str, handler):
+        def load_pil_image(idAndHandler):
+            (id, handler) = idAndHandler
+            (previousHandler, lastHandler) = handler.split_last()
+            if previousHandler == None:
+                pilImage = self.get_raw_pil_image(id)
+            else:
+                pilImage = self.render_pil_image(viewport, cache, id, previousHandler)
+            return lastHandler.handle_image(viewport, pilImage)
+        return cache.get_or_load((id, handler), load_pil_image)
+
+    def get_pil_image(self, app, id: str, handler):
+        pending = self.pendingRescale
+        if pending != None and (id, handler) not in self.pilImageCache.cache:
+            # The current images are of the former size, so an image first drawn during a
+            # rescale is rendered at the new size and swapped in with the rescale's images
+            return self.render_pil_image(pending.viewport, pending.missedImages, id, handler)
+        return self.render_pil_image(app, self.pilImageCache, id, handler)
+
+    def get_tkinter_image(self, app, id: str, handler, pilImage = None):
+        def load_tkinter_image(idAndHandler):
+            (id, handler) = idAndHandler
+            nonlocal pilImage
+            if pilImage == None:
+                pilImage = self.get_pil_image(app, id, handler)
+            return ImageTk.PhotoImage(pilImage)
+        return self.tkImageCache.get_or_load((id, handler), load_tkinter_image)
+
+    # Masks are rendered through the same handler as the drawn sprite, but in
+    # the mask viewport, so they never require a window and survive resizes
+    def get_collision_mask(self, id: str, handler):
+        def load_collision_mask(idAndHandler):
+            (id, handler) = idAndHandler
+            pilImage = self.render_pil_image(self.maskViewport, self.maskPilImageCache, id, handler)
+            return CollisionMask.from_pil_image(pilImage, self.backgroundColor)
+        return self.collisionMaskCache.get_or_load((id, handler), load_collision_mask)
+
+    # Decodes the raw images behind the manifest's (id, handler) pairs, and renders
+    # their collision masks, on worker threads. Neither depends on the window, so this
+    # runs before it opens. The scaled images are then rendered by schedule_rescale()
+    def preload_sources(self, manifest) -> None:
+        self.manifest = list(manifest)
+        executor = self.get_executor()
+        (storedImages, unstoredHandlersById) = self.split_stored(self.maskViewport,
+                                                                 group_handlers_by_id(self.manifest))
+        sourceIds = { self.source_id(id) for id in unstoredHandlersById }
+        sourcePaths = [ self.image_path(id) for id in sourceIds ]
+        for (id, rawPilImage) in zip(sourceIds, executor.map(decode_image, sourcePaths)):
+            self.rawPilImageCache.put(id, rawPilImage)
+        futures = []
+        for (id, handlers) in unstoredHandlersById.items():
+            rawPilImage = self.get_raw_pil_image(id)
+            futures.append(executor.submit(render_scaled_images, self.maskViewport, rawPilImage, id, handlers))
+        renderedImages = [ image for future in futures for image in future.result() ]
+        for (key, pilImage) in list(storedImages.items()) + renderedImages:
+            self.maskPilImageCache.put(key, pilImage)
+        self.store_rendered(self.maskViewport, renderedImages)
+        for (id, handler) in self.manifest:
+            self.get_collision_mask(id, handler)
+
+    # Splits handlersById into a dict of the (id, handler) -> images stored on disk,
+    # and the handlers of each id which still need to be rendered
+    def split_stored(self, viewport, handlersById):
+        if self.diskCache == None:
+            return (dict(), handlersById)
+        entries = [ ((id, handler), self.image_path(self.source_id(id)))
+                    for (id, handlers) in handlersById.items() for handler in handlers ]
+        storedImages = self.diskCache.load(viewport, entries)
+        unstoredHandlersById = dict()
+        for (id, handlers) in handlersById.items():
+            unstoredHandlers = [ handler for handler in handlers if (id, handler) not in storedImages ]
+            if len(unstoredHandlers) > 0:
+                unstoredHandlersById[id] = unstoredHandlers
+        return (storedImages, unstoredHandlersById)
+
+    # Keeps the given ((id, handler), pilImage) pairs on disk for the next launch
+    # The pack is written on a worker thread, which is handed its own copies of the images
+    def store_rendered(self, viewport, renderedImages) -> None:
+        if self.diskCache == None or len(renderedImages) == 0:
+            return
+        images = [ ((key, self.image_path(self.source_id(key[0]))), pilImage.copy())
+                   for (key, pilImage) in renderedImages ]
+        self.get_executor().submit(self.diskCache.store, viewport, images)
+
+    def cache_statistics(self) -> dict:
+        return { "raw": self.rawPilImageCache.statistics(),
+                 "pil": self.pilImageCache.statistics(),
+                 "tk": self.tkImageCache.statistics(),
+                 "maskPil": self.maskPilImageCache.statistics(),
+                 "mask": self.collisionMaskCache.statistics() }
+
+    def get_executor(self):
+        if self.executor == None:
+            self.executor = ThreadPoolExecutor(thread_name_prefix = "gallery-worker")
+        return self.executor
+
+    # Re-renders every scaled image, and every image in the manifest, for the app's
+    # new size on worker threads
+    # The previous images stay in use until poll_rescale() swaps in the new ones
+    def schedule_rescale(self, app) -> None:
+        if self.pendingRescale != None:
+            self.pendingRescale.cancel()
+        executor = self.get_executor()
+        viewport = Viewport(app.width, app.height, app.backgroundColor)
+        keys = list(self.pilImageCache.cache) + self.manifest
+        (storedImages, unstoredHandlersById) = self.split_stored(viewport, group_handlers_by_id(keys))
+        futures = []
+        for (id, handlers) in unstoredHandlersById.items():
+            # The tkinter thread keeps reading the cached raw images meanwhile, so each task
+            # is handed its own copy, and no PIL image is shared between threads
+            rawPilImage = self.get_raw_pil_image(id).copy()
+            futures.append(executor.submit(render_scaled_images, viewport, rawPilImage, id, handlers))
+        tkinterKeys = set(self.tkImageCache.cache).union(self.manifest)
+        self.pendingRescale = PendingRescale(viewport, futures, storedImages, tkinterKeys)
+
+    def is_rescaling(self) -> bool:
+        return self.pendingRescale != None
+
+    # The fraction of the pending rescale which is done
+    def rescale_progress(self) -> float:
+        if self.pendingRescale == None:
+            return 1.0
+        return self.pendingRescale.progress()
+
+    # Called on the tkinter thread: once a rescale has finished, creates the
+    # tkinter images and swaps both caches in at once
+    def poll_rescale(self) -> None:
+        pending = self.pendingRescale
+        if pending == None or not pending.is_done():
+            return
+        self.pendingRescale = None
+        pilImageCache = self.newCache()
+        renderedImages = [ image for future in pending.futures for image in future.result() ]
+        for (key, pilImage) in (list(pending.missedImages.cache.items())
+                                + list(pending.storedImages.items()) + renderedImages):
+            pilImageCache.put(key, pilImage)
+        self.store_rendered(pending.viewport, renderedImages)
+        tkImageCache = self.newCache()
+        if ImageTk != None:
+            for key in pending.tkinterKeys:
+                if key in pilImageCache.cache:
+                    tkImageCache.put(key, ImageTk.PhotoImage(pilImageCache.cache[key]))
+        (self.pilImageCache, self.tkImageCache) = (pilImageCache, tkImageCache)
+        self.generation += 1
+
+    def close(self) -> None:
+        if self.pendingRescale != None:
+            self.pendingRescale.cancel()
+        if self.executor != None:
+            self.executor.shutdown(wait = False)
+
+# A rescale running on worker threads, plus the images it found stored on disk
+# and those first drawn while it was running
+class PendingRescale(object):
+    def __init__(self, viewport, futures, storedImages, tkinterKeys):
+        self.viewport = viewport
+        self.futures = futures
+        self.storedImages = storedImages
+        self.tkinterKeys = tkinterKeys
+        self.missedImages = Cache()
+
+    def is_done(self) -> bool:
+        return all(future.done() for future in self.futures)
+
+    def progress(self) -> float:
+        if len(self.futures) == 0:
+            return 1.0
+        return sum(1 for future in self.futures if future.done()) / len(self.futures)
+
+    def cancel(self) -> None:
+        for future in self.futures:
+            future.cancel()
+
+# Loads the image fully, as Image.open() only reads the header
+def decode_image(path: str):
+    # Use of Image.open() taken from cmu_112_graphics
+    pilImage = Image.open(path)
+    pilImage.load()
+    return pilImage
+
+# Groups (id, handler) pairs into the handlers of each id, without duplicates
+def group_handlers_by_id(keys) -> dict:
+    handlersById = dict()
+    for (id, handler) in keys:
+        handlers = handlersById.setdefault(id, [])
+        if handler not in handlers:
+            handlers.append(handler)
+    return handlersById
+
+# Runs on a worker thread: applies each handler to the raw image of one sprite
+# Returns a list of ((id, handler), pilImage) including intermediate images
+def render_scaled_images(viewport, rawPilImage, id: str, handlers) -> list:
+    images = dict()
+    def render(handler):
+        key = (id, handler)
+        if key not in images:
+            (previousHandler, lastHandler) = handler.split_last()
+            pilImage = rawPilImage if previousHandler == None else render(previousHandler)
+            images[key] = lastHandler.handle_image(viewport, pilImage)
+        return images[key]
+    for handler in handlers:
+        render(handler)
+    return list(images.items())
@@ -1,5 +1,11 @@
 
 from entity import *
+from board import MAX_PIXEL_X, MAX_PIXEL_Y, CollisionPath
+from shot_density import ShotDensityIndex
+from shot_pool import ShotPool, FACTION_STARSHIP, FACTION_ALIEN, FREE_SLOT
+from formation import Formation
+from scheduler import AlienScheduler, FORMATION_DANCE, ALIEN_DANCE, ALIEN_SHOOT, sample_geometric
+from spatial_index import SpatialGrid
 import copy, random
 
 class GameplayRegulator(object):
@@ -19,8 +25,10 @@ class GameplayRegulator(object):
     def should_move_shots(self) -> bool:
         return self.timeSinceLevelStart % self.moveShotsEveryThisTicks == 0
 
-    def should_dance_aliens(self) -> bool:
-        return self.timeSinceLevelStart % self.danceEveryThisTicks == 0
+    # The first tick after the current one on which aliens dance
+    def next_dance_tick(self) -> int:
+        every = self.danceEveryThisTicks
+        return (self.timeSinceLevelStart // every + 1) * every
 
     def should_spawn_aliens(self) -> bool:
         return self.timeSinceLevelStart % 40 == 0
@@ -28,14 +36,45 @@ class GameplayRegulator(object):
     def should_cleanup_entities(self) -> bool:
         return self.timeSinceLevelStart % 20 == 0
 
+# A set which iterates in insertion order
+# Entities hash by identity, so a plain set would iterate them in an order which
+# differs between runs, and with it the order the rng is drawn from
+class EntitySet(object):
+    def __init__(self, entities = ()):
+        self.entities = dict.fromkeys(entities)
+
+    def add(self, entity) -> None:
+        self.entities[entity] = None
+
+    def remove(self, entity) -> None:
+        del self.entities[entity]
+
+    def __contains__(self, entity) -> bool:
+        return entity in self.entities
+
+    def __iter__(self):
+        return iter(self.entities)
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def __copy__(self):
+        return EntitySet(self.entities)
+
 class Game(object):
-    def __init__(self, regulator, initialStarship):
+    # All randomness of the game is drawn from rng, so seeding it makes the game deterministic
+    def __init__(self, regulator, initialStarship, rng = None):
         self.regulator = regulator
-        self.drawableEntities = set()
+        self.rng = rng if rng != None else random.Random()
+        self.drawableEntities = EntitySet()
         self.starships = []
-        self.aliens = set()
-        self.incomingAliens = set()
-        self.shots = set()
+        self.aliens = EntitySet()
+        self.incomingAliens = EntitySet()
+        self.alienScheduler = AlienScheduler()
+        self.formations = []
+        self.shotPool = ShotPool()
+        # Broad phase grids of what each faction's shots can hit
+        self.collisionGrids = { FACTION_STARSHIP: SpatialGrid(), FACTION_ALIEN: SpatialGrid() }
         self.add_starship(initialStarship)
         self.moveShotsByPixels = 8
 
@@ -50,6 +89,17 @@ class Game(object):
     def add_alien(self, alien) -> None:
         self.aliens.add(alien)
         self.drawableEntities.add(alien)
+        nextDanceTick = self.regulator.next_dance_tick()
+        self.alienScheduler.schedule(nextDanceTick, ALIEN_DANCE, alien)
+        self.schedule_alien_shot(alien, nextDanceTick)
+
+    # Schedules the alien's next shot on one of the dance ticks from firstTick on
+    # The alien has a chance of firing after every dance step, so how many steps
+    # until it fires is sampled from a geometric distribution
+    def schedule_alien_shot(self, alien, firstTick: int) -> None:
+        steps = sample_geometric(self.rng, 1 / alien.shot_creation_chance())
+        shotTick = firstTick + (steps - 1) * self.regulator.danceEveryThisTicks
+        self.alienScheduler.schedule(shotTick, ALIEN_SHOOT, alien)
 
     def remove_alien(self, alien) -> None:
         self.aliens.remove(alien)
@@ -57,15 +107,10 @@ class Game(object):
 
     def fire_starship_shot(self) -> None:
         for starship in self.starships:
-            self.add_shot(starship.create_shot())
-
-    def add_shot(self, shot):
-        self.shots.add(shot)
-        self.drawableEntities.add(shot)
+            self.add_shot(*starship.create_shot())
 
-    def remove_shot(self, shot) -> None:
-        self.shots.remove(shot)
-        self.drawableEntities.remove(shot)
+    def add_shot(self, position, direction, faction: int) -> int:
+        return self.shotPool.spawn(position, direction, faction)
 
     def move_each_starship(self, xshift: int) -> None:
         starships = self.starships
@@ -88,49 +133,105 @@ class Game(object):
         cleanup_certain_entities(self.aliens)
         cleanup_certain_entities(self.incomingAliens)
 
+    # Runs the dance steps and shots of the aliens which are due to act this tick
+    # Dead aliens are not scheduled again, so their events lapse
     def dance_aliens(self):
-        for incomingAlien in copy.copy(self.incomingAliens):
-            if incomingAlien.is_alive():
-                incomingAlien.dance_along()
-                if not incomingAlien.is_incoming():
-                    self.incomingAliens.remove(incomingAlien)
-                    self.aliens.add(incomingAlien)
-        for alien in copy.copy(self.aliens):
-            if alien.is_alive():
-                alien.dance_along()
-                if random.randint(1, alien.shot_creation_chance()) == 1:
-                    self.add_shot(alien.create_shot())
-
-    def move_shots(self, collidables, collidable_type, collision_handler) -> None:
-        for shot in copy.copy(self.shots):
-            if not shot.affects_entity_type(collidable_type):
+        regulator = self.regulator
+        now = regulator.timeSinceLevelStart
+        for (kind, alien) in self.alienScheduler.pop_due(now):
+            if kind == FORMATION_DANCE:
+                formation = alien
+                formation.step(now)
+                if len(formation) > 0:
+                    self.alienScheduler.schedule(now + regulator.danceEveryThisTicks, FORMATION_DANCE, formation)
+                else:
+                    self.formations.remove(formation)
                 continue
-            collisionPath = shot.move(self.regulator.moveShotsByPixels)
-            collisionPath.isDebugging = self.regulator.isDebugging
-            if shot.position.is_out_of_bounds():
-                self.remove_shot(shot)
+            if not alien.is_alive():
                 continue
-            for collidable in collidables:
-                if collidable.is_alive() and collidable.collides_with(collisionPath):
-                    collidable.destroy()
-                    collision_handler(shot, collidable)
-                    self.remove_shot(shot)
-                    break
-
-    def move_all_shots(self, app):
-        galaga = app.galaga
-        def handle_starship_shot_collision(starshipShot, alien) -> None:
+            if kind == ALIEN_DANCE:
+                alien.dance_along()
+                if alien in self.incomingAliens and not alien.is_incoming():
+                    self.incomingAliens.remove(alien)
+                    self.aliens.add(alien)
+                # Once in lockstep with others, the alien dances with its formation instead
+                if not self.join_formation(alien, now):
+                    self.alienScheduler.schedule(now + regulator.danceEveryThisTicks, ALIEN_DANCE, alien)
+            else:
+                self.add_shot(*alien.create_shot(self.rng))
+                self.schedule_alien_shot(alien, now + regulator.danceEveryThisTicks)
+
+    # Adds the alien, which just danced, to a formation in lockstep with its dance stage,
+    # starting a new formation if there is none. Returns false if the stage is not one
+    # which can be danced in lockstep
+    def join_formation(self, alien, now: int) -> bool:
+        if alien.dance_stage.formation_key() == None:
+            return False
+        for formation in self.formations:
+            if formation.can_join(alien, now):
+                formation.join(alien)
+                return True
+        formation = Formation(alien.dance_stage, now)
+        formation.join(alien)
+        self.formations.append(formation)
+        self.alienScheduler.schedule(now + self.regulator.danceEveryThisTicks, FORMATION_DANCE, formation)
+        return True
+
+    # Moves every shot, removing those which leave the board or hit their target
+    # A single pass over the shot pool moves, culls and collides each shot
+    def move_all_shots(self, galaga):
+        def handle_starship_shot_collision(alien) -> None:
             galaga.score += alien.score_when_killed(galaga.currentLevel)
 
-        def handle_alien_shot_collision(alienShot, starship) -> None:
+        def handle_alien_shot_collision(starship) -> None:
             if len(self.starships) == 1:
                 galaga.game_over()
 
-        self.move_shots(self.aliens, Alien, handle_starship_shot_collision)
-        self.move_shots(self.starships, Starship, handle_alien_shot_collision)
+        grids = self.collisionGrids
+        grids[FACTION_STARSHIP].rebuild(self.aliens)
+        grids[FACTION_ALIEN].rebuild(self.starships)
+        collisionHandlers = { FACTION_STARSHIP: handle_starship_shot_collision,
+                              FACTION_ALIEN: handle_alien_shot_collision }
+        gallery = galaga.gallery
+        byPixels = self.regulator.moveShotsByPixels
+        pool = self.shotPool
+        (xs, ys, dxs, dys, factions) = (pool.xs, pool.ys, pool.dxs, pool.dys, pool.factions)
+        (bands, columns) = (pool.bands, pool.columns)
+        bandHeight = ShotDensityIndex.BAND_HEIGHT
+        for slot in range(pool.capacity()):
+            faction = factions[slot]
+            if faction == FREE_SLOT:
+                continue
+            (oldX, oldY) = (xs[slot], ys[slot])
+            (newX, newY) = (oldX + dxs[slot] * byPixels, oldY + dys[slot] * byPixels)
+            if newX < 0 or newY < 0 or newX > MAX_PIXEL_X or newY > MAX_PIXEL_Y:
+                pool.free(slot)
+                continue
+            (xs[slot], ys[slot]) = (newX, newY)
+            # Shots still on the board need no clamping to find their cell
+            (band, column) = (int(newY) // bandHeight, int(newX))
+            if band != bands[slot] or column != columns[slot]:
+                pool.move_cell(slot, band, column)
+            candidates = grids[faction].query_box(min(oldX, newX), min(oldY, newY),
+                                                  max(oldX, newX), max(oldY, newY))
+            if len(candidates) == 0:
+                continue
+            collisionPath = CollisionPath(Position(oldX, oldY), Position(newX, newY))
+            for collidable in candidates:
+                if collidable.is_alive() and collidable.collides_with(collisionPath, gallery):
+                    collidable.destroy()
+                    collisionHandlers[faction](collidable)
+                    pool.free(slot)
+                    break
+        pool.compact_if_sparse()
 
-    def tick(self, app):
+    def tick(self, galaga):
+        profiler = galaga.profiler
         if self.regulator.should_move_shots():
-            self.move_all_shots(app)
+            phaseStart = profiler.start()
+            self.move_all_shots(galaga)
+            profiler.stop("moveShots", phaseStart)
+        phaseStart = profiler.start()
         for drawableEntity in self.drawableEntities:
             drawableEntity.tick()
+        profiler.stop("entityTicks", phaseStart)
@@ -1,21 +1,112 @@
-import math
+import functools, math
 import board
+from collections import OrderedDict
 from PIL import Image
 
 class Cache(object):
     def __init__(self):
         self.cache = dict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
 
     def get_or_load(self, key, loadFn):
         value = self.cache.get(key)
         if value == None:
+            self.misses += 1
             value = loadFn(key)
             self.cache[key] = value
+        else:
+            self.hits += 1
         return value
 
+    def put(self, key, value) -> None:
+        self.cache[key] = value
+
     def purge(self):
         self.cache = dict()
 
+    def __len__(self) -> int:
+        return len(self.cache)
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def statistics(self) -> dict:
+        return { "entries": len(self), "hits": self.hits, "misses": self.misses,
+                 "evictions": self.evictions, "hitRate": self.hit_rate() }
+
+# A cache which evicts the least recently used entries once it holds more than
+# maxEntries values, or more than maxBytes as measured by sizeOf
+# Either limit may be None to leave it unbounded
+class LruCache(Cache):
+    def __init__(self, maxEntries = None, maxBytes = None, sizeOf = None):
+        super().__init__()
+        if maxBytes != None and sizeOf == None:
+            raise ValueError("A byte budget requires a sizeOf function")
+        self.cache = OrderedDict()
+        self.maxEntries = maxEntries
+        self.maxBytes = maxBytes
+        self.sizeOf = sizeOf
+        self.sizes = dict()
+        self.totalBytes = 0
+
+    def get_or_load(self, key, loadFn):
+        cache = self.cache
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+            return cache[key]
+        self.misses += 1
+        value = loadFn(key)
+        self.put(key, value)
+        return value
+
+    def put(self, key, value) -> None:
+        cache = self.cache
+        if key in cache:
+            self.totalBytes -= self.sizes.pop(key, 0)
+        cache[key] = value
+        cache.move_to_end(key)
+        if self.sizeOf != None:
+            size = self.sizeOf(value)
+            self.sizes[key] = size
+            self.totalBytes += size
+        self.evict_as_needed()
+
+    def evict_as_needed(self) -> None:
+        cache = self.cache
+        # Always keep the entry just loaded, even if it alone exceeds the budget
+        while len(cache) > 1 and self.is_over_budget():
+            (key, _) = cache.popitem(last = False)
+            self.totalBytes -= self.sizes.pop(key, 0)
+            self.evictions += 1
+
+    def is_over_budget(self) -> bool:
+        if self.maxEntries != None and len(self.cache) > self.maxEntries:
+            return True
+        return self.maxBytes != None and self.totalBytes > self.maxBytes
+
+    def purge(self):
+        self.cache = OrderedDict()
+        self.sizes = dict()
+        self.totalBytes = 0
+
+    def statistics(self) -> dict:
+        statistics = super().statistics()
+        statistics["bytes"] = self.totalBytes
+        return statistics
+
+# Estimates the memory held by a cached PIL image, tkinter image or collision mask
+def estimate_size_in_bytes(value) -> int:
+    if isinstance(value, Image.Image):
+        return value.width * value.height * len(value.getbands())
+    if isinstance(value, board.CollisionMask):
+        return value.width * value.height // 8
+    # Otherwise a tkinter PhotoImage, held as 32-bit pixels
+    return value.width() * value.height() * 4
+
 class ImageHandler(object):
     def __eq__(self, other) -> bool:
         if not isinstance(other, ImageHandler):
@@ -33,6 +124,11 @@ class ImageHandler(object):
     def cache_key(self, pilImage):
         raise Error("Must be implemented by sub-classes")
 
+    # Returns (previousHandler, lastHandler) so intermediate images can be cached
+    # previousHandler is None if there is no intermediate image
+    def split_last(self):
+        return (None, self)
+
 class ImageResizer(ImageHandler):
     def __init__(self, dimensions: (int, int)):
         self.dimensions = dimensions
@@ -45,7 +141,7 @@ class ImageResizer(ImageHandler):
         newHeight = pixelHeight * targetHeightInPixels
         newWidth = pixelWidth * targetWidthInPixels
         # Use of resize() taken from cmu_112_graphics
-        return pilImage.resize((round(newWidth), round(newHeight)), resample=Image.ANTIALIAS)
+        return pilImage.resize((round(newWidth), round(newHeight)), resample=Image.LANCZOS)
 
     def cache_key(self):
         return self.dimensions
@@ -61,7 +157,9 @@ class ImageRotator(ImageHandler):
             # Fast path: skip no-op rotation
             return pilImage
         clockwiseDegrees = clockwiseRadians * 180 / math.pi
-        return pilImage.rotate(clockwiseDegrees, fillcolor = app.backgroundColor)
+        # Images are rotated after being resized, so smooth the small result
+        return pilImage.rotate(clockwiseDegrees, resample = Image.BICUBIC,
+                               fillcolor = app.backgroundColor)
 
     def cache_key(self):
         return self.direction
@@ -78,3 +176,39 @@ class CombinedImageHandler(ImageHandler):
     def cache_key(self):
         cacheKeys = [ handler.cache_key() for handler in self.handlers ]
         return tuple(cacheKeys)
+
+    def split_last(self):
+        handlers = self.handlers
+        if len(handlers) == 1:
+            return handlers[0].split_last()
+        previousHandler = handlers[0] if len(handlers) == 2 else CombinedImageHandler(*handlers[:-1])
+        return (previousHandler, handlers[-1])
+
+# Headings are snapped to this many buckets, so each sprite has a bounded set of rotations
+ROTATION_BUCKETS = 64
+# The bucket of the heading at which sprites are drawn unrotated
+UPRIGHT_BUCKET = ROTATION_BUCKETS // 4
+
+# The handler used for drawing a sprite with the given dimensions and rotation bucket
+# Resizing first means every rotation of a sprite shares one resized image
+# Handlers are shared, so entities drawn alike hold references to the same one
+@functools.lru_cache(maxsize = None)
+def sprite_handler(dimensions: (int, int), bucket: int):
+    rotation = board.Direction(bucket * 2 * math.pi / ROTATION_BUCKETS)
+    return CombinedImageHandler(ImageResizer(dimensions), ImageRotator(rotation))
+
+# Tests the LruCache class
+def testLruCache() -> None:
+    print("Testing testLruCache()...")
+    cache = LruCache(maxEntries = 2, maxBytes = 10, sizeOf = len)
+    cache.get_or_load("a", lambda key: "aaa")
+    cache.get_or_load("b", lambda key: "bbb")
+    cache.get_or_load("a", lambda key: "unused")
+    # Exceeds the entry count, evicting b as the least recently used
+    cache.get_or_load("c", lambda key: "ccc")
+    assert list(cache.cache) == ["a", "c"], f"Really {list(cache.cache)}"
+    # Exceeds the byte budget, evicting both a and c
+    cache.get_or_load("d", lambda key: "dddddddd")
+    assert list(cache.cache) == ["d"], f"Really {list(cache.cache)}"
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 4, 3)
+    print("Passed")
@@ -0,0 +1,144 @@
+from alien import SOULS, BeeSpiral, FollowPath
+from board import Position
+from entity import Alien
+from path_table import keyframe_table
+import json
+
+# Reads a number, or a [start, stop, step] range, as a list of numbers
+def read_values(value) -> list:
+    if isinstance(value, list):
+        return list(range(*value))
+    return [ value ]
+
+# Compiles a named entry path into make_stage(nextDance, startPosition, endPosition)
+# Path tables are built here, once, and shared by every alien taking the path
+def compile_entry(name: str, definition: dict):
+    kind = definition.get("type")
+    if kind == "spiral":
+        timeToReach = definition.get("timeToReach", 32)
+        return lambda nextDance, start, end: BeeSpiral(nextDance, start, end, timeToReach)
+    if kind == "keyframes":
+        keyframes = tuple(tuple(keyframe) for keyframe in definition["keyframes"])
+        table = keyframe_table(keyframes, definition.get("stepsPerSegment", 8))
+        return lambda nextDance, start, end: FollowPath.between(nextDance, table, start, end)
+    raise ValueError(f"Path {name} has unknown type {kind}")
+
+# Aliens of one soul which spawn together, a delay of ticks after their level starts,
+# and fly in along an entry path, if any, from the start to their rest positions
+class SpawnBatch(object):
+    def __init__(self, delay: int, soul: str, makeEntry, startPosition, restPositions):
+        self.delay = delay
+        self.soul = soul
+        self.makeEntry = makeEntry
+        self.startPosition = startPosition
+        self.restPositions = restPositions
+
+    # Creates the aliens of this batch; nothing is created before the batch spawns
+    def spawn(self, galaga) -> list:
+        aliens = []
+        makeSoul = SOULS[self.soul]
+        for restPosition in self.restPositions:
+            soul = makeSoul(galaga.game)
+            if self.makeEntry == None:
+                alien = Alien(restPosition, restPosition, soul)
+            else:
+                alien = Alien(self.startPosition, restPosition, soul)
+                alien.dance_stage = self.makeEntry(soul.resting_dance(alien),
+                                                   self.startPosition, restPosition)
+            aliens.append(alien)
+        return aliens
+
+# A level compiled into spawn batches, in the order they spawn
+class CompiledLevel(object):
+    def __init__(self, batches):
+        self.batches = sorted(batches, key = lambda batch: batch.delay)
+
+def compile_formation(formation: dict, entries: dict):
+    soul = formation["soul"]
+    if soul not in SOULS:
+        raise ValueError(f"Unknown soul {soul}")
+    entryName = formation.get("entry")
+    makeEntry = None
+    if entryName != None:
+        if entryName not in entries:
+            raise ValueError(f"Unknown entry path {entryName}")
+        makeEntry = entries[entryName]
+    if "positions" in formation:
+        restPositions = [ Position(x, y) for (x, y) in formation["positions"] ]
+    else:
+        restPositions = [ Position(x, y) for y in read_values(formation["ys"])
+                                         for x in read_values(formation["xs"]) ]
+    startPosition = Position(*formation.get("start", (0, 288)))
+    return SpawnBatch(formation.get("delay", 0), soul, makeEntry, startPosition, restPositions)
+
+# A sequence of levels, read from JSON:
+#   { "version": 1,
+#     "paths": { name: { "type": "spiral", "timeToReach": ticks }
+#                    or { "type": "keyframes", "keyframes": [[x, y], ...], "stepsPerSegment": steps } },
+#     "levels": [ { "formations": [ { "soul": "bee" or "boss", "entry": path name (optional),
+#                                     "start": [x, y], "delay": ticks,
+#                                     "positions": [[x, y], ...] or "xs": .., "ys": .. } ] } ] }
+# where "xs" and "ys" are each a number or a [start, stop, step] range
+# Levels are compiled the first time they are played, so long campaigns start at once
+class Campaign(object):
+    VERSION = 1
+
+    def __init__(self, definition: dict):
+        if definition.get("version") != Campaign.VERSION:
+            raise ValueError(f"Levels must be of version {Campaign.VERSION}")
+        self.entries = { name: compile_entry(name, path)
+                         for (name, path) in definition.get("paths", dict()).items() }
+        self.levelDefinitions = definition["levels"]
+        self.compiledLevels = dict()
+
+    @staticmethod
+    def load(path: str):
+        with open(path) as file:
+            return Campaign(json.load(file))
+
+    def __len__(self) -> int:
+        return len(self.levelDefinitions)
+
+    # The compiled level at the given index, or None after the last level
+    def level(self, index: int):
+        if index >= len(self.levelDefinitions):
+            return None
+        compiledLevel = self.compiledLevels.get(index)
+        if compiledLevel == None:
+            formations = self.levelDefinitions[index]["formations"]
+            compiledLevel = CompiledLevel([ compile_formation(formation, self.entries)
+                                            for formation in formations ])
+            self.compiledLevels[index] = compiledLevel
+        return compiledLevel
+
+# Tests compiling formations, from ranges of positions to entry paths and delays,
+# and that unknown souls and paths are refused
+def testCampaign() -> None:
+    print("Testing testCampaign()...")
+    def campaign_of(formations: list):
+        return Campaign({ "version": Campaign.VERSION,
+                          "paths": { "swoop": { "type": "keyframes", "keyframes": [[0, 0], [1, 1]] } },
+                          "levels": [ { "formations": formations } ] })
+    campaign = campaign_of([
+        { "soul": "boss", "positions": [[112, 250]], "delay": 40 },
+        { "soul": "bee", "entry": "swoop", "start": [0, 200], "xs": [20, 60, 20], "ys": [100, 124, 12] } ])
+    assert len(campaign) == 1 and campaign.level(1) == None
+    level = campaign.level(0)
+    assert level is campaign.level(0)
+    (bees, bosses) = level.batches
+    assert (bees.soul, bees.delay, bosses.soul, bosses.delay) == ("bee", 0, "boss", 40)
+    assert bees.restPositions == [ Position(20, 100), Position(40, 100), Position(20, 112), Position(40, 112) ]
+    assert bees.startPosition == Position(0, 200) and bosses.makeEntry == None
+    from engine import new_galaga
+    aliens = bees.spawn(new_galaga(None, campaign, 0))
+    assert [ alien.position for alien in aliens ] == [ Position(0, 200) ] * 4
+    assert isinstance(aliens[0].dance_stage, FollowPath)
+    for (formation, message) in [ ({ "soul": "wasp", "positions": [[0, 0]] }, "Unknown soul wasp"),
+                                  ({ "soul": "bee", "entry": "loop", "positions": [[0, 0]] },
+                                   "Unknown entry path loop") ]:
+        try:
+            campaign_of([ formation ]).level(0)
+            assert False, f"Compiled {formation}"
+        except ValueError as error:
+            assert str(error) == message, f"Really {error}"
+    print("Passed")
@@ -0,0 +1,72 @@
+import functools, math
+
+# The steps of a flight path, as a sequence of (dx, dy) deltas
+# Tables only depend on the shape of the path, so aliens flying the same shape
+# share one table, each scaling it to its own start and end
+class PathTable(object):
+    __slots__ = ("deltas",)
+
+    def __init__(self, deltas):
+        self.deltas = tuple(deltas)
+
+    def __len__(self) -> int:
+        return len(self.deltas)
+
+    @staticmethod
+    def from_points(points):
+        deltas = [ (x1 - x0, y1 - y0) for ((x0, y0), (x1, y1)) in zip(points, points[1:]) ]
+        return PathTable(deltas)
+
+# The spiral r = theta, from theta = 2π/3 down to 0, in steps of its formula's units
+@functools.lru_cache(maxsize = None)
+def spiral_table(timeToReach: int):
+    theta = 2 * math.pi / 3
+    deltas = []
+    while True:
+        thetaFinal = theta - 2 * math.pi / (3 * timeToReach)
+        # Note that r = theta => dr = dtheta simplifies the mathematics here
+        (x0, y0) = (theta * math.cos(theta), theta * math.sin(theta))
+        (x1, y1) = (thetaFinal * math.cos(thetaFinal), thetaFinal * math.sin(thetaFinal))
+        deltas.append((x1 - x0, y1 - y0))
+        theta = thetaFinal
+        # We've reached the end of the spiral if theta <= 0
+        if thetaFinal <= 0:
+            return PathTable(deltas)
+
+# A Catmull-Rom spline through the given (x, y) keyframes, taking the given amount of
+# steps between each pair of keyframes. The path passes through every keyframe
+# Keyframes are usually given from (0, 0) to (1, 1), to be scaled from start to end
+@functools.lru_cache(maxsize = None)
+def keyframe_table(keyframes: tuple, stepsPerSegment: int):
+    # Repeat the ends, so the first and last segments have neighbours
+    controls = (keyframes[0],) + tuple(keyframes) + (keyframes[-1],)
+    points = [ keyframes[0] ]
+    for segment in range(len(keyframes) - 1):
+        (p0, p1, p2, p3) = controls[segment:segment + 4]
+        for step in range(1, stepsPerSegment):
+            t = step / stepsPerSegment
+            points.append(catmull_rom_point(p0, p1, p2, p3, t))
+        # End exactly on the keyframe, so rounding does not accumulate
+        points.append(p2)
+    return PathTable.from_points(points)
+
+def catmull_rom_point(p0, p1, p2, p3, t: float):
+    def interpolate(v0, v1, v2, v3) -> float:
+        return 0.5 * (2 * v1 + (v2 - v0) * t + (2 * v0 - 5 * v1 + 4 * v2 - v3) * t**2
+                      + (3 * v1 - v0 - 3 * v2 + v3) * t**3)
+    return (interpolate(p0[0], p1[0], p2[0], p3[0]), interpolate(p0[1], p1[1], p2[1], p3[1]))
+
+# Tests that a keyframe path passes through its keyframes, and ends exactly on the last
+def testKeyframeTable() -> None:
+    print("Testing testKeyframeTable()...")
+    keyframes = ((0, 0), (0.5, 1.5), (1, 1))
+    table = keyframe_table(keyframes, 4)
+    assert len(table) == 8, f"Really {len(table)}"
+    (x, y) = (0, 0)
+    for (step, (dx, dy)) in enumerate(table.deltas):
+        (x, y) = (x + dx, y + dy)
+        if step == 3:
+            assert abs(x - 0.5) < 10**-9 and abs(y - 1.5) < 10**-9, f"Really {(x, y)}"
+    assert abs(x - 1) < 10**-9 and abs(y - 1) < 10**-9, f"Really {(x, y)}"
+    assert keyframe_table(keyframes, 4) is table
+    print("Passed")
@@ -0,0 +1,85 @@
+import csv, json, math, time
+from collections import deque
+
+# Rolling window of the durations of one phase, in seconds
+class PhaseTimings(object):
+    def __init__(self, windowSize: int):
+        self.samples = deque(maxlen = windowSize)
+        self.count = 0
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+
+    # Nearest-rank percentile of the current window, in milliseconds
+    def percentile(self, sortedSamples, percent: float) -> float:
+        if len(sortedSamples) == 0:
+            return 0.0
+        rank = max(math.ceil(percent / 100 * len(sortedSamples)), 1)
+        return sortedSamples[rank - 1] * 1000
+
+    def summary(self) -> dict:
+        sortedSamples = sorted(self.samples)
+        return { "count": self.count,
+                 "p50Ms": self.percentile(sortedSamples, 50),
+                 "p95Ms": self.percentile(sortedSamples, 95),
+                 "p99Ms": self.percentile(sortedSamples, 99) }
+
+# Records how long each phase of a tick, and each redraw, takes
+# Recording is a clock read and a deque append, so it is always on
+class Profiler(object):
+    def __init__(self, windowSize: int = 1000, clock = time.perf_counter):
+        self.windowSize = windowSize
+        self.clock = clock
+        self.phases = dict()
+
+    def start(self) -> float:
+        return self.clock()
+
+    # Returns the elapsed seconds, which are also recorded for the phase
+    def stop(self, phase: str, startTime: float) -> float:
+        timings = self.phases.get(phase)
+        if timings == None:
+            timings = PhaseTimings(self.windowSize)
+            self.phases[phase] = timings
+        elapsed = self.clock() - startTime
+        timings.record(elapsed)
+        return elapsed
+
+    def report(self, galaga) -> dict:
+        game = galaga.game
+        return { "phases": { phase: timings.summary() for (phase, timings) in self.phases.items() },
+                 "caches": galaga.gallery.cache_statistics(),
+                 "counts": { "drawables": len(game.drawableEntities),
+                             "aliens": len(game.aliens) + len(game.incomingAliens),
+                             "shots": len(game.shotPool) } }
+
+    # Lines of text summarising the report, for the on-canvas overlay
+    def overlay_lines(self, galaga) -> list:
+        report = self.report(galaga)
+        lines = [ f"{'phase':<12}{'p50':>7} {'p95':>7} {'p99':>7} (ms)" ]
+        for (phase, summary) in sorted(report["phases"].items()):
+            lines.append(f"{phase:<12}{summary['p50Ms']:>7.3f} {summary['p95Ms']:>7.3f} {summary['p99Ms']:>7.3f}")
+        for (cacheName, statistics) in report["caches"].items():
+            lines.append(f"{cacheName} cache: {statistics['entries']} entries, "
+                         f"{statistics['hitRate']:.1%} hits, {statistics['evictions']} evictions")
+        counts = report["counts"]
+        lines.append(f"aliens: {counts['aliens']}  shots: {counts['shots']}  drawables: {counts['drawables']}")
+        return lines
+
+    # Writes the report as JSON, or as name,value rows if the path ends in .csv
+    def export(self, path: str, galaga) -> None:
+        report = self.report(galaga)
+        with open(path, "w", newline = "") as file:
+            if not path.endswith(".csv"):
+                json.dump(report, file, indent = 2)
+                return
+            writer = csv.writer(file)
+            writer.writerow(["name", "value"])
+            for (section, entries) in report.items():
+                for (name, value) in entries.items():
+                    if isinstance(value, dict):
+                        for (field, fieldValue) in value.items():
+                            writer.writerow([f"{section}.{name}.{field}", fieldValue])
+                    else:
+                        writer.writerow([f"{section}.{name}", value])
@@ -0,0 +1,230 @@
+from board import MAX_PIXEL_Y, board_pixel_size
+from shot_pool import FACTION_STARSHIP, FREE_SLOT
+
+# Canvas layers, from back to front
+LAYER_BACKGROUND = 0
+LAYER_SHIPS_AND_SHOTS = 1
+LAYER_INCOMING_ALIVE = 2
+LAYER_INCOMING_DEAD = 3
+LAYER_ALIENS_ALIVE = 4
+LAYER_ALIENS_DEAD = 5
+LAYER_OVERLAY = 6
+LAYER_COUNT = 7
+
+def rgb_to_hex(rgb: (int, int, int)):
+    def format_hex(value: int) -> str:
+        return hex(value)[2:]
+    (r, g, b) = rgb
+    (r, g, b) = (format_hex(r), format_hex(g), format_hex(b))
+    return f"#{r}{g}{b}"
+
+# A canvas item which persists across frames
+# Tk is only called when what the item shows actually changes
+class CanvasItem(object):
+    def __init__(self):
+        self.id = None
+        self.coords = None
+        self.look = None
+        self.layer = None
+        self.hidden = False
+
+    def show_image(self, canvas, x, y, tkinterImage) -> None:
+        coords = (x, y)
+        if self.id == None:
+            self.id = canvas.create_image(x, y, image = tkinterImage)
+        else:
+            if self.look is not tkinterImage:
+                canvas.itemconfig(self.id, image = tkinterImage)
+            if self.coords != coords:
+                canvas.coords(self.id, x, y)
+        (self.coords, self.look) = (coords, tkinterImage)
+
+    def show_rectangle(self, canvas, x1, y1, x2, y2, color: str) -> None:
+        coords = (x1, y1, x2, y2)
+        if self.id == None:
+            self.id = canvas.create_rectangle(x1, y1, x2, y2, fill = color, outline = color)
+        else:
+            self.unhide(canvas)
+            if self.look != color:
+                canvas.itemconfig(self.id, fill = color, outline = color)
+            if self.coords != coords:
+                canvas.coords(self.id, x1, y1, x2, y2)
+        (self.coords, self.look) = (coords, color)
+
+    # An unfilled rectangle, drawn as an outline of the given width
+    def show_outline(self, canvas, x1, y1, x2, y2, color: str, width: int) -> None:
+        coords = (x1, y1, x2, y2)
+        if self.id == None:
+            self.id = canvas.create_rectangle(x1, y1, x2, y2, outline = color, width = width)
+        else:
+            self.unhide(canvas)
+            if self.coords != coords:
+                canvas.coords(self.id, x1, y1, x2, y2)
+        (self.coords, self.look) = (coords, color)
+
+    def show_text(self, canvas, x, y, text: str, **options) -> None:
+        coords = (x, y)
+        if self.id == None:
+            self.id = canvas.create_text(x, y, text = text, **options)
+        else:
+            if self.look != text:
+                canvas.itemconfig(self.id, text = text)
+            if self.coords != coords:
+                canvas.coords(self.id, x, y)
+        (self.coords, self.look) = (coords, text)
+
+    # Hides the item, keeping it to be shown again later
+    def hide(self, canvas) -> None:
+        if self.id != None and not self.hidden:
+            canvas.itemconfig(self.id, state = "hidden")
+            self.hidden = True
+
+    def unhide(self, canvas) -> None:
+        if self.hidden:
+            canvas.itemconfig(self.id, state = "normal")
+            self.hidden = False
+
+    def delete(self, canvas) -> None:
+        if self.id != None:
+            canvas.delete(self.id)
+        (self.id, self.coords, self.look, self.layer) = (None, None, None, None)
+        self.hidden = False
+
+# Retained-mode renderer: keeps one canvas item per drawable between frames
+# Items are only created and deleted when drawables are added or cleaned up
+class Renderer(object):
+    # The profiler overlay is refreshed every this many frames, as percentiles need a sort
+    PROFILER_REFRESH_FRAMES = 30
+
+    def __init__(self):
+        self.canvas = None
+        self.showProfiler = False
+        self.frameCount = 0
+
+    def reset(self, canvas) -> None:
+        self.canvas = canvas
+        # Invisible markers separating the layers, created back to front
+        self.layerMarkers = [ canvas.create_line(0, 0, 0, 0, state = "hidden")
+                              for _ in range(LAYER_COUNT) ]
+        self.items = dict()
+        # Shot items are kept per pool slot, and hidden while their slot is free
+        self.shotItems = []
+        self.background = CanvasItem()
+        self.scoreText = CanvasItem()
+        self.titleText = CanvasItem()
+        self.profilerText = CanvasItem()
+        self.preloadText = CanvasItem()
+        self.preloadBar = CanvasItem()
+        self.pauseOutline = CanvasItem()
+
+    # Moves an item into a layer, if not there already
+    def place(self, canvas, item, layer: int) -> None:
+        if item.layer != layer:
+            canvas.tag_lower(item.id, self.layerMarkers[layer])
+            item.layer = layer
+
+    def layer_of(self, game, drawable) -> int:
+        # Draw the incoming aliens before the existing ones
+        # Draw the alive ones before the dead ones to show explosions in background
+        if drawable in game.aliens:
+            return LAYER_ALIENS_ALIVE if drawable.is_alive() else LAYER_ALIENS_DEAD
+        if drawable in game.incomingAliens:
+            return LAYER_INCOMING_ALIVE if drawable.is_alive() else LAYER_INCOMING_DEAD
+        return LAYER_SHIPS_AND_SHOTS
+
+    def render_background(self, app, canvas) -> None:
+        if canvas is not self.canvas:
+            self.reset(canvas)
+        self.background.show_rectangle(canvas, 0, 0, app.width, app.height,
+                                       rgb_to_hex(app.backgroundColor))
+        self.place(canvas, self.background, LAYER_BACKGROUND)
+
+    # Outlines the canvas in red while the app is paused
+    # cmu_112_graphics only draws this outline when it clears the canvas, which a retained one never is
+    def render_pause_outline(self, app, canvas) -> None:
+        if canvas is not self.canvas:
+            self.reset(canvas)
+        if app._paused:
+            self.pauseOutline.show_outline(canvas, 0, 0, app.width, app.height, "red", 10)
+            self.place(canvas, self.pauseOutline, LAYER_OVERLAY)
+        else:
+            self.pauseOutline.hide(canvas)
+
+    # Shows how much of the preload is done, in place of the game
+    def render_preload(self, app, canvas, progress: float) -> None:
+        self.render_background(app, canvas)
+        (centerX, centerY) = (app.width / 2, app.height / 2)
+        self.preloadText.show_text(canvas, centerX, centerY, f"Loading {progress:.0%}", fill = "white")
+        self.place(canvas, self.preloadText, LAYER_OVERLAY)
+        (barLeft, barTop) = (app.width / 4, centerY + 16)
+        self.preloadBar.show_rectangle(canvas, barLeft, barTop, barLeft + progress * app.width / 2,
+                                       barTop + 8, "white")
+        self.place(canvas, self.preloadBar, LAYER_OVERLAY)
+
+    def render(self, app, canvas) -> None:
+        self.render_background(app, canvas)
+        self.preloadText.delete(canvas)
+        self.preloadBar.delete(canvas)
+        galaga = app.galaga
+        game = galaga.game
+        self.scoreText.show_text(canvas, 0, 0,
+                                 f"Level: {galaga.currentLevel}  Score: {galaga.score}",
+                                 fill = "white", anchor = "nw")
+        self.place(canvas, self.scoreText, LAYER_OVERLAY)
+        titleOverlay = galaga.title_overlay()
+        if titleOverlay != None:
+            self.titleText.show_text(canvas, app.width / 2, app.height / 2,
+                                     titleOverlay, fill = "white")
+            self.place(canvas, self.titleText, LAYER_OVERLAY)
+        else:
+            self.titleText.delete(canvas)
+        self.render_drawables(app, canvas, game)
+        self.render_shots(app, canvas, game.shotPool)
+        self.render_profiler(canvas, galaga)
+        self.frameCount += 1
+
+    def render_shots(self, app, canvas, pool) -> None:
+        items = self.shotItems
+        while len(items) < pool.capacity():
+            items.append(CanvasItem())
+        # The pool shrinks once compacted, so the items of the slots it dropped go too
+        while len(items) > pool.capacity():
+            items.pop().delete(canvas)
+        (pixelWidth, pixelHeight) = board_pixel_size(app)
+        (xs, ys, factions) = (pool.xs, pool.ys, pool.factions)
+        for slot in range(pool.capacity()):
+            item = items[slot]
+            faction = factions[slot]
+            if faction == FREE_SLOT:
+                item.hide(canvas)
+                continue
+            # Galaga uses cartesian coordinates, but on the canvas "up is down"
+            (x1, y1) = (xs[slot] * pixelWidth, (MAX_PIXEL_Y - ys[slot]) * pixelHeight)
+            color = "blue" if faction == FACTION_STARSHIP else "red"
+            item.show_rectangle(canvas, x1, y1, x1 + pixelWidth, y1 - pixelHeight, color)
+            self.place(canvas, item, LAYER_SHIPS_AND_SHOTS)
+
+    def render_profiler(self, canvas, galaga) -> None:
+        if not self.showProfiler:
+            self.profilerText.delete(canvas)
+            return
+        if self.profilerText.id == None or self.frameCount % Renderer.PROFILER_REFRESH_FRAMES == 0:
+            text = "\n".join(galaga.profiler.overlay_lines(galaga))
+            self.profilerText.show_text(canvas, 0, 16, text, fill = "yellow",
+                                        anchor = "nw", font = "Courier 8")
+            self.place(canvas, self.profilerText, LAYER_OVERLAY)
+
+    def render_drawables(self, app, canvas, game) -> None:
+        items = self.items
+        drawables = game.drawableEntities
+        for drawable in drawables:
+            item = items.get(drawable)
+            if item == None:
+                item = CanvasItem()
+                items[drawable] = item
+            drawable.draw_on(app, canvas, item)
+            self.place(canvas, item, self.layer_of(game, drawable))
+        # Every drawable has an item now, so any extra items belong to removed drawables
+        if len(items) != len(drawables):
+            for drawable in [ drawable for drawable in items if drawable not in drawables ]:
+                items.pop(drawable).delete(canvas)
@@ -0,0 +1,111 @@
+import struct
+
+# Recordings are a header of the seed, then one record per input of the tick it
+# happened before and the input, then an end record holding the total tick count
+MAGIC = b"GRPL"
+VERSION = 1
+HEADER = struct.Struct("<4sHQ") # magic, version, seed
+RECORD = struct.Struct("<IB") # tick, input
+END_OF_RECORDING = 255
+
+# A recorded session, which replays identically given the same build
+class Recording(object):
+    def __init__(self, seed: int, inputs: list, tickCount: int):
+        self.seed = seed
+        # (tick, input) pairs, in the order they happened
+        self.inputs = inputs
+        self.tickCount = tickCount
+
+    @staticmethod
+    def read(path: str):
+        with open(path, "rb") as file:
+            data = file.read()
+        (magic, version, seed) = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a recording of version {VERSION}")
+        records = data[HEADER.size:]
+        # Ignore a record cut short by the game stopping mid-write
+        records = records[:len(records) - len(records) % RECORD.size]
+        inputs = []
+        tickCount = None
+        for (tick, playerInput) in RECORD.iter_unpack(records):
+            if playerInput == END_OF_RECORDING:
+                tickCount = tick
+                break
+            inputs.append((tick, playerInput))
+        if tickCount == None:
+            # The recording was cut short, so it ends with its last input
+            tickCount = inputs[-1][0] if len(inputs) > 0 else 0
+        return Recording(seed, inputs, tickCount)
+
+# Writes the inputs of a session as they happen
+class InputRecorder(object):
+    def __init__(self, path: str, seed: int):
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, seed))
+
+    def record(self, tick: int, playerInput: int) -> None:
+        self.file.write(RECORD.pack(tick, playerInput))
+
+    def close(self, tickCount: int) -> None:
+        self.file.write(RECORD.pack(tickCount, END_OF_RECORDING))
+        self.file.close()
+
+# Tests that a recording reads back as it was written
+def testRecording() -> None:
+    print("Testing testRecording()...")
+    import os, tempfile
+    (handle, path) = tempfile.mkstemp(suffix = ".rec")
+    os.close(handle)
+    recorder = InputRecorder(path, 112)
+    recorder.record(0, 2)
+    recorder.record(15, 1)
+    recorder.close(40)
+    recording = Recording.read(path)
+    os.remove(path)
+    assert (recording.seed, recording.inputs, recording.tickCount) == (112, [(0, 2), (15, 1)], 40)
+    print("Passed")
+
+# The outcome of a session, as text which compares equal between processes
+def describe_outcome(galaga) -> str:
+    aliens = [ (alien.position.x, alien.position.y, alien.is_alive()) for alien in galaga.game.aliens ]
+    return repr((galaga.tickCount, galaga.currentLevel, galaga.score, galaga.state,
+                 len(galaga.game.shotPool), aliens))
+
+# Tests that a session replays identically in a fresh process, where every entity
+# has a different identity, on a level crowded enough for shots to overlap aliens
+def testReplayInFreshProcess() -> None:
+    print("Testing testReplayInFreshProcess()...")
+    import os, subprocess, sys, tempfile
+    from engine import INPUT_FIRE, INPUT_MOVE_LEFT, INPUT_MOVE_RIGHT, new_galaga
+    from gallery import Gallery
+    from levels import Campaign
+    sourceDir = os.path.dirname(os.path.abspath(__file__))
+    imageDir = os.path.join(sourceDir, "..", "images")
+    levelsPath = os.path.join(sourceDir, "..", "levels", "stress.json")
+    (handle, path) = tempfile.mkstemp(suffix = ".rec")
+    os.close(handle)
+    galaga = new_galaga(Gallery(imageDir), Campaign.load(levelsPath), 9)
+    galaga.recorder = InputRecorder(path, galaga.seed)
+    for tick in range(1200):
+        if tick % 10 == 0:
+            galaga.handle_input(INPUT_FIRE)
+        if tick % 50 < 10:
+            galaga.handle_input(INPUT_MOVE_LEFT if tick % 100 < 50 else INPUT_MOVE_RIGHT)
+        galaga.tick()
+    galaga.recorder.close(galaga.tickCount)
+    replay = ("import sys\n"
+              "sys.path.insert(0, sys.argv[1])\n"
+              "from engine import replay_headless\n"
+              "from gallery import Gallery\n"
+              "from levels import Campaign\n"
+              "from replay import Recording, describe_outcome\n"
+              "(galaga, _) = replay_headless(Recording.read(sys.argv[2]), Gallery(sys.argv[3]),\n"
+              "                              Campaign.load(sys.argv[4]))\n"
+              "print(describe_outcome(galaga))\n")
+    result = subprocess.run([ sys.executable, "-c", replay, sourceDir, path, imageDir, levelsPath ],
+                            capture_output = True, text = True)
+    os.remove(path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == describe_outcome(galaga), f"Really {result.stdout[:200]}"
+    print("Passed")
@@ -0,0 +1,50 @@
+import heapq, math
+
+# Kinds of alien events. At the same tick, formations dance, then lone aliens dance,
+# then aliens shoot
+FORMATION_DANCE = 0
+ALIEN_DANCE = 1
+ALIEN_SHOOT = 2
+
+# A priority queue of what each alien does next, keyed on the tick it is due
+# Only the aliens which act in a tick are visited, rather than the whole swarm
+class AlienScheduler(object):
+    def __init__(self):
+        self.events = []
+        # Breaks ties in scheduling order, so the order events run in is deterministic
+        self.nextSequence = 0
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def schedule(self, tick: int, kind: int, alien) -> None:
+        heapq.heappush(self.events, (tick, kind, self.nextSequence, alien))
+        self.nextSequence += 1
+
+    # Yields (kind, alien) of each event due at or before the given tick, removing them
+    # Events scheduled meanwhile for a later tick are left for later
+    def pop_due(self, tick: int):
+        events = self.events
+        while len(events) > 0 and events[0][0] <= tick:
+            (_, kind, _, alien) = heapq.heappop(events)
+            yield (kind, alien)
+
+# Samples how many trials it takes to succeed at one, if each succeeds with the given
+# probability. Equivalent to rolling the dice every trial, but with a single draw
+def sample_geometric(rng, probability: float) -> int:
+    if probability >= 1:
+        return 1
+    return 1 + int(math.log(1.0 - rng.random()) / math.log(1.0 - probability))
+
+# Tests that events run in tick order, dancing before shooting, and only once due
+def testAlienScheduler() -> None:
+    print("Testing testAlienScheduler()...")
+    scheduler = AlienScheduler()
+    scheduler.schedule(8, ALIEN_SHOOT, "a")
+    scheduler.schedule(8, ALIEN_DANCE, "b")
+    scheduler.schedule(4, ALIEN_DANCE, "a")
+    assert list(scheduler.pop_due(3)) == []
+    assert list(scheduler.pop_due(4)) == [(ALIEN_DANCE, "a")]
+    assert list(scheduler.pop_due(8)) == [(ALIEN_DANCE, "b"), (ALIEN_SHOOT, "a")]
+    assert len(scheduler) == 0
+    print("Passed")
@@ -0,0 +1,73 @@
+from board import MAX_PIXEL_X, MAX_PIXEL_Y
+
+# Counts of cells in a grid, where both adding to a cell and summing a rectangle
+# from the origin take O(log rows * log columns)
+class FenwickTree2D(object):
+    def __init__(self, rows: int, columns: int):
+        self.rows = rows
+        self.columns = columns
+        # 1-based, so row 0 and column 0 of the tree are unused
+        self.tree = [0] * ((rows + 1) * (columns + 1))
+
+    def add(self, row: int, column: int, delta: int) -> None:
+        (tree, stride) = (self.tree, self.columns + 1)
+        i = row + 1
+        while i <= self.rows:
+            j = column + 1
+            while j <= self.columns:
+                tree[i * stride + j] += delta
+                j += j & -j
+            i += i & -i
+
+    # The sum of the cells in rows below rowLimit and columns below columnLimit
+    def prefix_sum(self, rowLimit: int, columnLimit: int) -> int:
+        (tree, stride) = (self.tree, self.columns + 1)
+        total = 0
+        i = rowLimit
+        while i > 0:
+            j = columnLimit
+            while j > 0:
+                total += tree[i * stride + j]
+                j -= j & -j
+            i -= i & -i
+        return total
+
+# How many shots of each faction are in each horizontal band and board column
+# Kept up to date by the ShotPool as shots spawn, move and are freed
+class ShotDensityIndex(object):
+    BAND_HEIGHT = 16
+
+    def __init__(self, factionCount: int = 2):
+        self.columnCount = MAX_PIXEL_X + 1
+        self.bandCount = MAX_PIXEL_Y // ShotDensityIndex.BAND_HEIGHT + 1
+        self.trees = [ FenwickTree2D(self.bandCount, self.columnCount) for _ in range(factionCount) ]
+
+    # Shots may start slightly off the board, so cells are clamped to it
+    def column_of(self, x: float) -> int:
+        return min(max(int(x), 0), self.columnCount - 1)
+
+    def band_of(self, y: float) -> int:
+        return min(max(int(y) // ShotDensityIndex.BAND_HEIGHT, 0), self.bandCount - 1)
+
+    def add(self, faction: int, band: int, column: int, delta: int) -> None:
+        self.trees[faction].add(band, column, delta)
+
+    # Returns (left, right), the amounts of the faction's shots in the band of y or
+    # below, in the columns up to and including that of x, and those past it
+    def count_beside(self, faction: int, x: float, y: float):
+        tree = self.trees[faction]
+        bandLimit = self.band_of(y) + 1
+        below = tree.prefix_sum(bandLimit, self.columnCount)
+        left = tree.prefix_sum(bandLimit, self.column_of(x) + 1)
+        return (left, below - left)
+
+# Tests counting shots either side of a point, in and below its band
+def testShotDensityIndex() -> None:
+    print("Testing testShotDensityIndex()...")
+    index = ShotDensityIndex()
+    for (faction, x, y) in [ (0, 10, 5), (0, 100, 5), (0, 150, 40), (0, 150, 200), (1, 20, 5) ]:
+        index.add(faction, index.band_of(y), index.column_of(x), 1)
+    assert index.count_beside(0, 120, 50) == (2, 1), f"Really {index.count_beside(0, 120, 50)}"
+    assert index.count_beside(0, 100, 0) == (2, 0)
+    assert index.count_beside(1, 0, 288) == (0, 1)
+    print("Passed")
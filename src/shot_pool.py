@@ -0,0 +1,120 @@
+from board import Position
+from shot_density import ShotDensityIndex
+
+# Which side fired a shot, which decides what it can hit
+FACTION_STARSHIP = 0 # Hits aliens
+FACTION_ALIEN = 1 # Hits starships
+# Marks a slot which holds no shot
+FREE_SLOT = -1
+
+# Structure-of-arrays store of every shot in flight
+# Each shot occupies a slot across the parallel lists. Freed slots are reused by
+# later shots, so steady fire allocates nothing. The columns are plain lists, as
+# the game reads them one slot at a time, which lists do without boxing each value
+class ShotPool(object):
+    def __init__(self):
+        self.xs = []
+        self.ys = []
+        self.dxs = []
+        self.dys = []
+        self.factions = []
+        # The cell of each shot in the density index
+        self.bands = []
+        self.columns = []
+        self.density = ShotDensityIndex()
+        self.freeSlots = []
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    # The number of slots, including free ones
+    def capacity(self) -> int:
+        return len(self.factions)
+
+    # Adds a shot moving in the direction (dx, dy), returning its slot
+    def spawn(self, position, direction, faction: int) -> int:
+        (dx, dy) = direction
+        density = self.density
+        (band, column) = (density.band_of(position.y), density.column_of(position.x))
+        if len(self.freeSlots) > 0:
+            slot = self.freeSlots.pop()
+            (self.xs[slot], self.ys[slot]) = (float(position.x), float(position.y))
+            (self.dxs[slot], self.dys[slot]) = (float(dx), float(dy))
+            self.factions[slot] = faction
+            (self.bands[slot], self.columns[slot]) = (band, column)
+        else:
+            slot = len(self.factions)
+            self.xs.append(float(position.x))
+            self.ys.append(float(position.y))
+            self.dxs.append(float(dx))
+            self.dys.append(float(dy))
+            self.factions.append(faction)
+            self.bands.append(band)
+            self.columns.append(column)
+        density.add(faction, band, column, 1)
+        self.count += 1
+        return slot
+
+    # Moves the shot in the slot to another cell of the density index
+    def move_cell(self, slot: int, band: int, column: int) -> None:
+        density = self.density
+        faction = self.factions[slot]
+        density.add(faction, self.bands[slot], self.columns[slot], -1)
+        density.add(faction, band, column, 1)
+        (self.bands[slot], self.columns[slot]) = (band, column)
+
+    def free(self, slot: int) -> None:
+        self.density.add(self.factions[slot], self.bands[slot], self.columns[slot], -1)
+        self.factions[slot] = FREE_SLOT
+        self.freeSlots.append(slot)
+        self.count -= 1
+
+    def active_slots(self) -> list:
+        return [ slot for (slot, faction) in enumerate(self.factions) if faction != FREE_SLOT ]
+
+    # Drops the free slots once they outnumber the shots, keeping the order of the shots,
+    # so passes over the slots cost in proportion to the shots in flight rather than
+    # to the most shots ever in flight. Slots change, so only call this between passes
+    def compact_if_sparse(self) -> None:
+        if len(self.freeSlots) <= self.count:
+            return
+        live = self.active_slots()
+        self.xs = [ self.xs[slot] for slot in live ]
+        self.ys = [ self.ys[slot] for slot in live ]
+        self.dxs = [ self.dxs[slot] for slot in live ]
+        self.dys = [ self.dys[slot] for slot in live ]
+        self.factions = [ self.factions[slot] for slot in live ]
+        self.bands = [ self.bands[slot] for slot in live ]
+        self.columns = [ self.columns[slot] for slot in live ]
+        self.freeSlots = []
+
+# Tests that freed slots are reused, and that the density index follows the shots
+def testShotPool() -> None:
+    print("Testing testShotPool()...")
+    pool = ShotPool()
+    slots = [ pool.spawn(Position(20 * index + 10, 40), (0, 1), FACTION_STARSHIP) for index in range(5) ]
+    assert slots == [0, 1, 2, 3, 4] and len(pool) == 5 and pool.capacity() == 5
+    pool.free(1)
+    pool.free(3)
+    assert len(pool) == 3 and pool.active_slots() == [0, 2, 4]
+    assert pool.density.count_beside(FACTION_STARSHIP, 60, 40) == (2, 1)
+    reused = [ pool.spawn(Position(100, 40), (0, 1), FACTION_STARSHIP) for _ in range(2) ]
+    assert sorted(reused) == [1, 3] and pool.capacity() == 5, f"Really {reused}"
+    assert pool.spawn(Position(200, 10), (0, -1), FACTION_ALIEN) == 5 and pool.capacity() == 6
+    assert pool.density.count_beside(FACTION_STARSHIP, 60, 40) == (2, 3)
+    assert pool.density.count_beside(FACTION_ALIEN, 60, 40) == (0, 1)
+    pool.move_cell(0, pool.density.band_of(40), pool.density.column_of(80))
+    assert pool.density.count_beside(FACTION_STARSHIP, 60, 40) == (1, 4)
+    # Once most slots are free, compacting shrinks the pool to the shots left, in order
+    for slot in (0, 1, 2):
+        pool.free(slot)
+    pool.compact_if_sparse()
+    assert pool.capacity() == 6 and len(pool) == 3
+    pool.free(3)
+    pool.compact_if_sparse()
+    assert pool.capacity() == 2 and pool.factions == [FACTION_STARSHIP, FACTION_ALIEN]
+    assert pool.xs == [90, 200] and pool.freeSlots == []
+    assert pool.density.count_beside(FACTION_STARSHIP, 60, 40) == (0, 1)
+    assert pool.spawn(Position(10, 10), (0, 1), FACTION_STARSHIP) == 2
+    print("Passed")
@@ -0,0 +1,276 @@
+from alien import SOULS, FollowPath, BeeBackAndForth, BossAvoidShots
+from board import Position
+from entity import Alien, Starship
+from formation import Formation
+from game import Game, GameplayRegulator, EntitySet
+from path_table import PathTable
+from scheduler import FORMATION_DANCE
+from sprite import SPRITES
+import io, pickle, random, struct
+
+# Snapshots are a header, then the state of the simulation pickled as plain lists,
+# tuples, dicts, numbers, strings and bytes, so the schema is independent of the
+# classes of the game and bumping VERSION is enough to change it
+MAGIC = b"GSNP"
+VERSION = 2
+HEADER = struct.Struct("<4sH") # magic, version
+
+# Refuses anything but the plain values snapshots are made of
+class StateUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Snapshots may not contain {module}.{name}")
+
+# The complete state of a simulation at the end of a tick, from which it resumes identically
+# Only the simulation is kept: the gallery, campaign, profiler and recorder are not
+class Snapshot(object):
+    def __init__(self, state: dict):
+        self.state = state
+
+    @staticmethod
+    def capture(galaga):
+        game = galaga.game
+        regulator = game.regulator
+        # Entities, dance stages and path tables are referred to by their index in these
+        entities = list(game.drawableEntities)
+        entityIndices = { entity: index for (index, entity) in enumerate(entities) }
+        stages = []
+        stageIndices = dict()
+        tables = []
+        tableIndices = dict()
+
+        def table_index(table) -> int:
+            index = tableIndices.get(table)
+            if index == None:
+                index = tableIndices[table] = len(tables)
+                tables.append(table.deltas)
+            return index
+
+        def stage_index(stage):
+            if stage == None:
+                return None
+            index = stageIndices.get(stage)
+            if index == None:
+                index = stageIndices[stage] = len(stages)
+                stages.append(None)
+                stages[index] = stage_record(stage)
+            return index
+
+        def stage_record(stage) -> tuple:
+            if isinstance(stage, FollowPath):
+                return ("path", stage_index(stage.nextDance), table_index(stage.table),
+                        stage.xscale, stage.yscale, stage.step, stage.isIncoming)
+            if isinstance(stage, BeeBackAndForth):
+                return ("backAndForth", stage.stepAmount, stage.stage)
+            if isinstance(stage, BossAvoidShots):
+                return ("avoidShots",)
+            raise ValueError(f"Cannot snapshot dance stage {type(stage).__name__}")
+
+        animationsBySheet = { animation.sheetId: animation.name
+                              for animation in SPRITES.animations.values() }
+        def entity_record(entity) -> tuple:
+            shape = entity.shape
+            # Entities show their sprite's image, or a frame of an animation
+            image = None
+            if shape.id != shape.sprite.imageId:
+                image = (animationsBySheet[shape.id.sheetId], shape.id.index)
+            lifeStatus = entity.lifeStatus
+            if isinstance(entity, Starship):
+                (kind, rest, stage) = ("starship", None, None)
+            else:
+                kind = entity.alienSoul.name
+                if kind not in SOULS:
+                    raise ValueError(f"Cannot snapshot alien soul {type(entity.alienSoul).__name__}")
+                rest = (entity.positionAtRest.x, entity.positionAtRest.y)
+                stage = stage_index(entity.dance_stage)
+            return (kind, entity.position.x, entity.position.y, rest, lifeStatus.alive,
+                    lifeStatus.deathAnimationSpeed, lifeStatus.deathAnimationTick,
+                    image, shape.rotationBucket, stage)
+
+        entityRecords = [ entity_record(entity) for entity in entities ]
+        formations = game.formations
+        formationIndices = { formation: index for (index, formation) in enumerate(formations) }
+        # Members which were cleaned up are dead, and so would be dropped on the next step anyway
+        formationRecords = [ (stage_index(formation.stage),
+                              [ entityIndices[alien] for alien in formation.members if alien in entityIndices ],
+                              formation.lastStepTick)
+                             for formation in formations ]
+        # Likewise, the events of cleaned up aliens would lapse
+        events = []
+        for (tick, kind, sequence, actor) in game.alienScheduler.events:
+            actorIndices = formationIndices if kind == FORMATION_DANCE else entityIndices
+            if actor in actorIndices:
+                events.append((tick, kind, sequence, actorIndices[actor]))
+        # A sorted list is a valid heap
+        events.sort()
+
+        pool = game.shotPool
+        pendingBatches = []
+        if len(galaga.pendingBatches) > 0:
+            batches = galaga.campaign.level(galaga.currentLevel - 1).batches
+            pendingBatches = [ batches.index(batch) for batch in galaga.pendingBatches ]
+        return Snapshot({
+            "galaga": { "seed": galaga.seed, "tickCount": galaga.tickCount,
+                        "currentLevel": galaga.currentLevel, "score": galaga.score,
+                        "state": galaga.state, "levelStartTick": galaga.levelStartTick,
+                        "pendingBatches": pendingBatches },
+            "regulator": { "timeSinceLevelStart": regulator.timeSinceLevelStart,
+                           "moveShotsEveryThisTicks": regulator.moveShotsEveryThisTicks,
+                           "danceEveryThisTicks": regulator.danceEveryThisTicks,
+                           "moveShotsByPixels": regulator.moveShotsByPixels,
+                           "isDebugging": regulator.isDebugging },
+            "rng": game.rng.getstate(),
+            "tables": tables,
+            "stages": stages,
+            "entities": entityRecords,
+            "starships": [ entityIndices[starship] for starship in game.starships ],
+            "aliens": [ entityIndices[alien] for alien in game.aliens ],
+            "incomingAliens": [ entityIndices[alien] for alien in game.incomingAliens ],
+            "formations": formationRecords,
+            "events": events,
+            "nextSequence": game.alienScheduler.nextSequence,
+            "shots": { "xs": list(pool.xs), "ys": list(pool.ys),
+                       "dxs": list(pool.dxs), "dys": list(pool.dys),
+                       "factions": list(pool.factions),
+                       "bands": list(pool.bands), "columns": list(pool.columns),
+                       "freeSlots": list(pool.freeSlots), "count": pool.count }
+        })
+
+    # Rebuilds the game, with new entities, stages and shots equal to those captured
+    def restore_game(self):
+        state = self.state
+        regulator = GameplayRegulator()
+        for (name, value) in state["regulator"].items():
+            setattr(regulator, name, value)
+        rng = random.Random()
+        rng.setstate(state["rng"])
+        # The game starts out with a starship, which the restored ones replace
+        game = Game(regulator, Starship(Position(0, 0)), rng)
+
+        tables = [ PathTable(deltas) for deltas in state["tables"] ]
+        stages = []
+        nextDances = []
+        for record in state["stages"]:
+            kind = record[0]
+            if kind == "path":
+                (_, nextDance, table, xscale, yscale, step, isIncoming) = record
+                stage = FollowPath(None, tables[table], xscale, yscale, isIncoming)
+                stage.step = step
+            elif kind == "backAndForth":
+                (_, stepAmount, phase) = record
+                (stage, nextDance) = (BeeBackAndForth(stepAmount), None)
+                stage.stage = phase
+            elif kind == "avoidShots":
+                (stage, nextDance) = (BossAvoidShots(game), None)
+            else:
+                raise ValueError(f"Unknown dance stage {kind}")
+            stages.append(stage)
+            nextDances.append(nextDance)
+        # Stages may refer to stages after them, so they are linked once all exist
+        for (stage, nextDance) in zip(stages, nextDances):
+            if nextDance != None:
+                stage.nextDance = stages[nextDance]
+
+        entities = []
+        for (kind, x, y, rest, alive, deathAnimationSpeed, deathAnimationTick,
+             image, rotationBucket, stage) in state["entities"]:
+            if kind == "starship":
+                entity = Starship(Position(x, y))
+            else:
+                entity = Alien(Position(x, y), Position(*rest), SOULS[kind](game))
+                entity.dance_stage = stages[stage]
+            lifeStatus = entity.lifeStatus
+            lifeStatus.alive = alive
+            lifeStatus.deathAnimationSpeed = deathAnimationSpeed
+            lifeStatus.deathAnimationTick = deathAnimationTick
+            shape = entity.shape
+            if image != None:
+                (animation, index) = image
+                shape.set_image_id(SPRITES.get_animation(animation).frames[index])
+            shape.set_rotation_bucket(rotationBucket)
+            entities.append(entity)
+        game.drawableEntities = EntitySet(entities)
+        game.starships = [ entities[index] for index in state["starships"] ]
+        game.aliens = EntitySet(entities[index] for index in state["aliens"])
+        game.incomingAliens = EntitySet(entities[index] for index in state["incomingAliens"])
+
+        for (stage, members, lastStepTick) in state["formations"]:
+            formation = Formation(stages[stage], lastStepTick)
+            formation.members = [ entities[index] for index in members ]
+            game.formations.append(formation)
+        scheduler = game.alienScheduler
+        scheduler.events = [ (tick, kind, sequence,
+                              game.formations[actor] if kind == FORMATION_DANCE else entities[actor])
+                             for (tick, kind, sequence, actor) in state["events"] ]
+        scheduler.nextSequence = state["nextSequence"]
+
+        shots = state["shots"]
+        pool = game.shotPool
+        for name in ("xs", "ys", "dxs", "dys", "factions", "bands", "columns"):
+            setattr(pool, name, list(shots[name]))
+        pool.freeSlots = list(shots["freeSlots"])
+        pool.count = shots["count"]
+        # The density index only counts shots by cell, so it is rebuilt from them
+        for slot in pool.active_slots():
+            pool.density.add(pool.factions[slot], pool.bands[slot], pool.columns[slot], 1)
+        return game
+
+    # Restores the progress through the campaign and the score to the galaga
+    def restore_progress(self, galaga) -> None:
+        progress = self.state["galaga"]
+        galaga.seed = progress["seed"]
+        galaga.tickCount = progress["tickCount"]
+        galaga.currentLevel = progress["currentLevel"]
+        galaga.score = progress["score"]
+        galaga.state = progress["state"]
+        galaga.levelStartTick = progress["levelStartTick"]
+        galaga.pendingBatches = []
+        if len(progress["pendingBatches"]) > 0:
+            batches = galaga.campaign.level(galaga.currentLevel - 1).batches
+            galaga.pendingBatches = [ batches[index] for index in progress["pendingBatches"] ]
+
+    def to_bytes(self) -> bytes:
+        return HEADER.pack(MAGIC, VERSION) + pickle.dumps(self.state, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def from_bytes(data: bytes):
+        (magic, version) = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a snapshot of version {VERSION}")
+        return Snapshot(StateUnpickler(io.BytesIO(data[HEADER.size:])).load())
+
+    @staticmethod
+    def read(path: str):
+        with open(path, "rb") as file:
+            return Snapshot.from_bytes(file.read())
+
+    def write(self, path: str) -> None:
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+# Tests that a restored game plays on exactly as the one it was captured from
+def testSnapshot() -> None:
+    print("Testing testSnapshot()...")
+    from engine import INPUT_FIRE, INPUT_MOVE_RIGHT, new_galaga, resume_galaga
+    from gallery import Gallery
+    from levels import Campaign
+    import os
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    gallery = Gallery(os.path.join(root, "images"))
+    campaign = Campaign.load(os.path.join(root, "levels", "campaign.json"))
+    def play(galaga, ticks: int) -> None:
+        for _ in range(ticks):
+            if galaga.tickCount % 15 == 0:
+                galaga.handle_input(INPUT_FIRE)
+            if galaga.tickCount % 40 < 8:
+                galaga.handle_input(INPUT_MOVE_RIGHT)
+            galaga.tick()
+    galaga = new_galaga(gallery, campaign, 7)
+    play(galaga, 700)
+    data = Snapshot.capture(galaga).to_bytes()
+    resumed = resume_galaga(Snapshot.from_bytes(data), gallery, campaign)
+    assert Snapshot.capture(resumed).to_bytes() == data
+    play(galaga, 900)
+    play(resumed, 900)
+    (expected, actual) = (Snapshot.capture(galaga).state, Snapshot.capture(resumed).state)
+    assert expected == actual, f"Really {actual['galaga']}, not {expected['galaga']}"
+    print("Passed")
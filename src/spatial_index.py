@@ -0,0 +1,70 @@
+import math
+from board import MAX_PIXEL_X, MAX_PIXEL_Y
+
+# A uniform grid over the board, used as a broad phase before exact collision checks
+# Each cell lists the entities whose rectangular bounding box overlaps it
+class SpatialGrid(object):
+    def __init__(self, cellSize: int = 32):
+        self.cellSize = cellSize
+        self.columns = MAX_PIXEL_X // cellSize + 1
+        self.rows = MAX_PIXEL_Y // cellSize + 1
+        self.cells = [ [] for _ in range(self.columns * self.rows) ]
+
+    def clear(self) -> None:
+        for cell in self.cells:
+            cell.clear()
+
+    # Yields the indices of the cells overlapping the given box
+    # Boxes partly outside the board are clamped to the edge cells
+    def cells_overlapping(self, minX, minY, maxX, maxY):
+        cellSize = self.cellSize
+        (lastColumn, lastRow) = (self.columns - 1, self.rows - 1)
+        firstColumn = min(max(math.floor(minX / cellSize), 0), lastColumn)
+        endColumn = min(max(math.floor(maxX / cellSize), 0), lastColumn)
+        firstRow = min(max(math.floor(minY / cellSize), 0), lastRow)
+        endRow = min(max(math.floor(maxY / cellSize), 0), lastRow)
+        for row in range(firstRow, endRow + 1):
+            for column in range(firstColumn, endColumn + 1):
+                yield row * self.columns + column
+
+    def insert(self, entity) -> None:
+        (bottomLeft, topRight) = entity.rectangular_bounding_box()
+        for index in self.cells_overlapping(bottomLeft.x, bottomLeft.y, topRight.x, topRight.y):
+            self.cells[index].append(entity)
+
+    # Replaces the contents of the grid with the live entities given
+    def rebuild(self, entities) -> None:
+        self.clear()
+        for entity in entities:
+            if entity.is_alive():
+                self.insert(entity)
+
+    # Returns the entities which may intersect the given box, in the order the cells list them
+    # The order decides which entity a shot hits first, so it must not depend on identity hashes
+    def query_box(self, minX, minY, maxX, maxY) -> dict:
+        candidates = dict()
+        for index in self.cells_overlapping(minX, minY, maxX, maxY):
+            candidates.update(dict.fromkeys(self.cells[index]))
+        return candidates
+
+# Tests that boxes off the board are clamped to its edge cells, and that queries
+# return each live entity once, in the order the cells list them
+def testSpatialGrid() -> None:
+    print("Testing testSpatialGrid()...")
+    from alien import BeeSoul
+    from board import Position
+    from entity import Alien
+    grid = SpatialGrid()
+    (corner, straddler, farCorner, dead) = [ Alien(position, position, BeeSoul()) for position in
+        (Position(4, 4), Position(32, 32), Position(MAX_PIXEL_X, MAX_PIXEL_Y), Position(100, 100)) ]
+    dead.lifeStatus.alive = False
+    assert list(grid.cells_overlapping(-50, -50, -10, -10)) == [0]
+    assert list(grid.cells_overlapping(1000, 1000, 2000, 2000)) == [len(grid.cells) - 1]
+    grid.rebuild([ corner, straddler, farCorner, dead ])
+    assert list(grid.query_box(-20, -20, 2, 2)) == [corner, straddler]
+    assert list(grid.query_box(40, 40, 50, 50)) == [straddler]
+    assert list(grid.query_box(MAX_PIXEL_X + 10, MAX_PIXEL_Y + 10, 500, 500)) == [farCorner]
+    assert list(grid.query_box(90, 90, 110, 110)) == []
+    # The straddler overlaps four cells, but is returned once
+    assert list(grid.query_box(0, 0, 60, 60)) == [corner, straddler]
+    print("Passed")
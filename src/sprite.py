@@ -0,0 +1,70 @@
+from collections import namedtuple
+
+# The immutable description of a sprite, shared by every entity drawn with it
+# Per-entity state such as the current image and heading is kept by a Shape instead
+class SpriteDefinition(namedtuple("SpriteDefinition", ["name", "imageId", "dimensions", "rotates"])):
+    __slots__ = ()
+
+# One frame of an animation's sprite sheet, usable wherever an image id is
+# box is the (left, top, right, bottom) of the frame within the sheet
+class SheetFrame(namedtuple("SheetFrame", ["sheetId", "index", "box"])):
+    __slots__ = ()
+
+# An immutable animation whose frames are laid out row by row in one sprite sheet
+# Frames are looked up by integer index, so playing it never builds image ids
+class AnimationDefinition(namedtuple("AnimationDefinition", ["name", "sheetId", "frames"])):
+    __slots__ = ()
+
+    @staticmethod
+    def from_sheet(name: str, sheetId: str, frameSize: (int, int), columns: int, frameCount: int):
+        (frameWidth, frameHeight) = frameSize
+        frames = []
+        for index in range(frameCount):
+            (row, column) = divmod(index, columns)
+            (left, top) = (column * frameWidth, row * frameHeight)
+            frames.append(SheetFrame(sheetId, index, (left, top, left + frameWidth, top + frameHeight)))
+        return AnimationDefinition(name, sheetId, tuple(frames))
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+# Looks up sprite and animation definitions by name
+class SpriteRegistry(object):
+    def __init__(self):
+        self.sprites = dict()
+        self.animations = dict()
+
+    def register(self, name: str, dimensions: (int, int), imageId: str = None,
+                 rotates: bool = False):
+        if name in self.sprites:
+            raise ValueError(f"Sprite {name} is already registered")
+        if imageId == None:
+            imageId = name
+        sprite = SpriteDefinition(name, imageId, dimensions, rotates)
+        self.sprites[name] = sprite
+        return sprite
+
+    def register_animation(self, name: str, sheetId: str, frameSize: (int, int),
+                           columns: int, frameCount: int):
+        if name in self.animations:
+            raise ValueError(f"Animation {name} is already registered")
+        animation = AnimationDefinition.from_sheet(name, sheetId, frameSize, columns, frameCount)
+        self.animations[name] = animation
+        return animation
+
+    def get(self, name: str):
+        return self.sprites[name]
+
+    def get_animation(self, name: str):
+        return self.animations[name]
+
+    def __iter__(self):
+        return iter(self.sprites.values())
+
+SPRITES = SpriteRegistry()
+STARSHIP_SPRITE = SPRITES.register("starship", (16, 16))
+BEE_SPRITE = SPRITES.register("bee", (16, 16), rotates = True)
+BOSS_SPRITE = SPRITES.register("boss", (16, 16), rotates = True)
+ABDUCTOR_SPRITE = SPRITES.register("abductor", (16, 16))
+# From https://www.hiclipart.com/free-transparent-background-png-clipart-beklu
+EXPLOSION_ANIMATION = SPRITES.register_animation("explosion", "explosion-sprite", (192, 192), 5, 20)
@@ -0,0 +1,62 @@
+import time
+
+# Schedules simulation ticks at a fixed rate, independent of how long rendering takes
+# Elapsed wall time is accumulated, and every tick which has become due is run
+# Rendering is limited separately, to at most one frame per display interval
+class FixedTimestep(object):
+    def __init__(self, ticksPerSecond: int = 100, framesPerSecond: int = 60,
+                 maxTicksPerUpdate: int = 10, clock = time.perf_counter):
+        self.tickInterval = 1 / ticksPerSecond
+        self.frameInterval = 1 / framesPerSecond
+        self.maxTicksPerUpdate = maxTicksPerUpdate
+        self.clock = clock
+        self.lastUpdate = None
+        self.lastFrame = None
+        self.accumulated = 0.0
+
+    # Returns how many ticks have become due since the last call
+    def ticks_due(self) -> int:
+        now = self.clock()
+        if self.lastUpdate == None:
+            self.lastUpdate = now
+            return 0
+        self.accumulated += now - self.lastUpdate
+        self.lastUpdate = now
+        ticks = int(self.accumulated / self.tickInterval)
+        if ticks > self.maxTicksPerUpdate:
+            # Too far behind to catch up: drop the backlog instead of spiralling
+            self.accumulated = 0.0
+            return self.maxTicksPerUpdate
+        self.accumulated -= ticks * self.tickInterval
+        return ticks
+
+    # Returns True, and starts a new frame, if a frame is due to be rendered
+    def frame_due(self) -> bool:
+        now = self.clock()
+        if self.lastFrame != None and now - self.lastFrame < self.frameInterval:
+            return False
+        self.lastFrame = now
+        return True
+
+# Tests the FixedTimestep class
+def testFixedTimestep() -> None:
+    print("Testing testFixedTimestep()...")
+    now = 0.0
+    # Powers of two keep the arithmetic exact
+    timestep = FixedTimestep(ticksPerSecond = 64, framesPerSecond = 32,
+                             maxTicksPerUpdate = 5, clock = lambda: now)
+    assert timestep.ticks_due() == 0
+    now = 2.5 / 64
+    assert timestep.ticks_due() == 2
+    # The left over half tick is carried over
+    now = 3 / 64
+    assert timestep.ticks_due() == 1
+    # Far behind, so capped
+    now = 1.0
+    assert timestep.ticks_due() == 5
+    assert timestep.frame_due()
+    now = 1 + 1 / 64
+    assert not timestep.frame_due()
+    now = 1 + 1 / 32
+    assert timestep.frame_due()
+    print("Passed")